@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import warnings
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import gdown
+
+from metrics import metrics
+
+# Where the model pickle comes from. Either the Google Drive URL, a local path
+# or a file:// URL, so the app can run fully offline.
+MODEL_SOURCE = os.environ.get('MODEL_SOURCE', 'https://drive.google.com/uc?id=1jZ-V5bhfxU5UCNwBlwM6KdODKyHBqNK1')
+
+# SHA-256 of the model pickle published at MODEL_SOURCE. A cached copy with a
+# different checksum is treated as stale and fetched again, and a download that
+# does not match is rejected. After publishing a new model, run
+#
+#     python artifacts.py
+#
+# and paste the printed checksum here, or set MODEL_SHA256 in the environment.
+PINNED_MODEL_SHA256 = None
+
+MODEL_SHA256 = os.environ.get('MODEL_SHA256', PINNED_MODEL_SHA256) or None
+
+# Without a pinned checksum, a copy fetched from a remote source is fetched and
+# checked again once it is older than this, so a replaced model is picked up.
+MODEL_MAX_AGE_HOURS = float(os.environ.get('MODEL_MAX_AGE_HOURS', 24))
+
+# Local store. Artifacts are kept under their checksum so several versions can
+# live side by side and a half-written file is never picked up.
+MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR', 'model_cache')
+
+_INDEX_FILE = 'index.json'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def local_source_path(source):
+    """Return the filesystem path of a local source, or None for a remote one."""
+    parsed = urlparse(source)
+    if parsed.scheme == 'file':
+        return url2pathname(parsed.path)
+    if parsed.scheme in ('http', 'https'):
+        return None
+    return source
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, _INDEX_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir, index):
+    with tempfile.NamedTemporaryFile('w', dir=cache_dir, delete=False) as file:
+        json.dump(index, file, indent=2)
+    os.replace(file.name, os.path.join(cache_dir, _INDEX_FILE))
+
+
+def _artifact_path(cache_dir, checksum):
+    return os.path.join(cache_dir, f'{checksum}.pkl')
+
+
+def _fetch(source, cache_dir, sha256):
+    # Copy or download the pickle into the store under its checksum
+    fd, download_path = tempfile.mkstemp(dir=cache_dir, suffix='.download')
+    os.close(fd)
+    try:
+        local_path = local_source_path(source)
+        with metrics.timer('artifact_download_seconds'):
+            if local_path is not None:
+                shutil.copyfile(local_path, download_path)
+            else:
+                gdown.download(source, download_path, quiet=False)
+        metrics.set_gauge('artifact_download_bytes', os.path.getsize(download_path))
+
+        checksum = _sha256(download_path)
+        if sha256 is not None and checksum != sha256:
+            raise ValueError(f'Model artifact from {source} has checksum {checksum}, expected {sha256}')
+        os.replace(download_path, _artifact_path(cache_dir, checksum))
+    finally:
+        if os.path.exists(download_path):
+            os.remove(download_path)
+
+    return checksum
+
+
+def _verified(cache_dir, checksum):
+    # Hash the stored copy before trusting it; a corrupted or truncated copy is
+    # removed so it is fetched again rather than failing on every start
+    path = _artifact_path(cache_dir, checksum)
+    if not os.path.exists(path):
+        return False
+    if _sha256(path) == checksum:
+        return True
+    warnings.warn(f'Cached model artifact {path} does not match its checksum; fetching it again')
+    os.remove(path)
+    metrics.increment('artifact_corrupt_total')
+    return False
+
+
+def load_model_objects(source=MODEL_SOURCE, sha256=MODEL_SHA256, cache_dir=MODEL_CACHE_DIR,
+                       max_age_hours=MODEL_MAX_AGE_HOURS):
+    """Return (objects, checksum) for the model pickle, fetching it only if needed.
+
+    A cached copy is used when its contents match ``sha256``. Without a pinned
+    checksum a local source is matched by its own checksum, and a remote one by
+    the copy last fetched from the same URL as long as that is under
+    ``max_age_hours`` old; an older copy is fetched again and replaced if it has
+    changed, or kept with a warning if the source cannot be reached.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _read_index(cache_dir)
+    checksum = sha256
+    previous = None
+    if checksum is None:
+        # A local file is cheap to hash, so it is always checked for changes
+        local_path = local_source_path(source)
+        if local_path is not None:
+            checksum = _sha256(local_path)
+        else:
+            warnings.warn(f'No pinned checksum for {source}; the cached copy is checked again '
+                          f'every {max_age_hours:g} hours. Set PINNED_MODEL_SHA256 or MODEL_SHA256.')
+            entry = index.get(source)
+            if isinstance(entry, dict):
+                previous = entry.get('checksum')
+                if time.time() - entry.get('fetched', 0) < max_age_hours * 3600:
+                    checksum = previous
+
+    if checksum is None or not _verified(cache_dir, checksum):
+        try:
+            checksum = _fetch(source, cache_dir, sha256)
+        except Exception as error:
+            # A failed refresh of an unpinned remote source falls back to the
+            # copy fetched before, so the app still starts while it is unreachable
+            if previous is None or not _verified(cache_dir, previous):
+                raise
+            warnings.warn(f'Could not refresh the model from {source} ({error}); using the copy fetched before')
+            metrics.increment('artifact_refresh_failures_total')
+            checksum = previous
+        else:
+            index[source] = {'checksum': checksum, 'fetched': time.time()}
+            _write_index(cache_dir, index)
+            metrics.increment('artifact_fetches_total')
+    else:
+        metrics.increment('artifact_cache_hits_total')
+
+    artifact_path = _artifact_path(cache_dir, checksum)
+    metrics.set_gauge('artifact_size_bytes', os.path.getsize(artifact_path))
+    with open(artifact_path, 'rb') as file, metrics.timer('artifact_load_seconds'):
+        loaded_objects = pickle.load(file)
+    return loaded_objects, checksum
+
+
+if __name__ == '__main__':
+    # Fetch MODEL_SOURCE afresh and print its checksum, for PINNED_MODEL_SHA256
+    print(load_model_objects(sha256=None, max_age_hours=0)[1])
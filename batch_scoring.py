@@ -0,0 +1,109 @@
+"""Chunked scoring of accident files.
+
+Used by the app for uploaded files. Files too large to upload (Streamlit caps
+uploads at 200 MB and holds them in memory) can be scored from the command line:
+
+    python batch_scoring.py accidents.parquet predictions.csv.gz
+"""
+import argparse
+import gzip
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from artifacts import load_model_objects
+from features import INPUT_COLUMNS, FeatureEncoder
+from metrics import metrics
+from tree_engine import compile_model
+
+# Probability of Serious at or above which an accident is labelled Serious
+SERIOUS_THRESHOLD = 0.55
+
+# Rows read, encoded and scored at a time; keeps memory bounded for any file size
+DEFAULT_CHUNK_SIZE = 50_000
+
+OUTPUT_COLUMNS = ['row', 'Probability_Slight', 'Probability_Serious', 'Predicted_Severity']
+
+
+def iter_chunks(file, file_name, chunk_size=DEFAULT_CHUNK_SIZE, columns=INPUT_COLUMNS):
+    """Yield (DataFrame, fraction_done) pairs of ``columns`` from a CSV or Parquet file."""
+    if file_name.lower().endswith('.parquet'):
+        parquet_file = pq.ParquetFile(file)
+        total_rows = max(parquet_file.metadata.num_rows, 1)
+        rows_read = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            chunk = batch.to_pandas()
+            rows_read += len(chunk)
+            yield chunk, rows_read / total_rows
+    else:
+        # The total row count of a CSV is unknown without reading it twice, so
+        # progress is measured by how far into the file the reader has got
+        file.seek(0, 2)
+        total_bytes = max(file.tell(), 1)
+        file.seek(0)
+        for chunk in pd.read_csv(file, chunksize=chunk_size, usecols=columns):
+            yield chunk, min(file.tell() / total_bytes, 1.0)
+
+
+def score_chunk(model, encoder, chunk, threshold=SERIOUS_THRESHOLD):
+    """Return (probabilities, labels) for every row of a DataFrame chunk."""
+    with metrics.timer('batch_preprocess_seconds'):
+        features = encoder.encode_frame(chunk)
+    with metrics.timer('batch_predict_seconds'):
+        probabilities = model.predict_proba(features)
+    metrics.increment('batch_rows_total', len(chunk))
+    labels = np.where(probabilities[:, 1] >= threshold, 'Serious', 'Slight')
+    return probabilities, labels
+
+
+def score_file(model, encoder, file, file_name, output, chunk_size=DEFAULT_CHUNK_SIZE,
+               threshold=SERIOUS_THRESHOLD, progress=None):
+    """Score an accident file chunk by chunk and write the results as CSV to output.
+
+    Only one chunk is held in memory at a time. ``progress`` is called with the
+    fraction of the file processed and the number of rows scored so far.
+    Returns the number of rows scored.
+    """
+    output.write(','.join(OUTPUT_COLUMNS) + '\n')
+    rows_scored = 0
+    for chunk, fraction_done in iter_chunks(file, file_name, chunk_size):
+        probabilities, labels = score_chunk(model, encoder, chunk, threshold)
+        results = pd.DataFrame({
+            'row': np.arange(rows_scored, rows_scored + len(chunk)),
+            'Probability_Slight': probabilities[:, 0],
+            'Probability_Serious': probabilities[:, 1],
+            'Predicted_Severity': labels,
+        }, columns=OUTPUT_COLUMNS)
+        results.to_csv(output, header=False, index=False, float_format='%.6f')
+        rows_scored += len(chunk)
+        if progress is not None:
+            progress(fraction_done, rows_scored)
+    return rows_scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='CSV or Parquet file with the columns ' + ', '.join(INPUT_COLUMNS))
+    parser.add_argument('output', help='CSV file to write the predictions to; gzip-compressed if it ends in .gz')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--threshold', type=float, default=SERIOUS_THRESHOLD,
+                        help='probability of Serious at or above which the label is Serious')
+    args = parser.parse_args()
+
+    objects, _ = load_model_objects()
+    model = compile_model(objects['model'])
+    encoder = FeatureEncoder.from_objects(objects)
+
+    def show_progress(fraction_done, rows_scored):
+        print(f'\r{fraction_done:6.1%}  {rows_scored:,} rows', end='', file=sys.stderr, flush=True)
+
+    open_output = gzip.open if args.output.endswith('.gz') else open
+    with open(args.input, 'rb') as file, open_output(args.output, 'wt', newline='') as output:
+        rows_scored = score_file(model, encoder, file, args.input, output, args.chunk_size, args.threshold, show_progress)
+    print(f'\nScored {rows_scored:,} rows into {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Microbenchmark: FeatureEncoder against the original preprocess_inputs().
+
+Run from the repository root:
+
+    python benchmarks/bench_feature_encoder.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features import CATEGORICAL_MAPPINGS, FeatureEncoder
+from workload import random_frame
+
+
+def legacy_preprocess(record):
+    # Same work as the original app.py preprocess_inputs(): the day index is
+    # found with list.index and all seven mappings are rebuilt on every call
+    day_of_week_encoded = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'].index(record['Day_of_Week'])
+    day_sin, day_cos = np.sin(2 * np.pi * day_of_week_encoded / 7), np.cos(2 * np.pi * day_of_week_encoded / 7)
+    mappings = {column: dict(mapping.items()) for column, mapping in CATEGORICAL_MAPPINGS.items()}
+    return np.array([day_sin, day_cos, record['Latitude'], record['Longitude'],
+                     record['Number_of_Vehicles'], record['Number_of_Casualties'],
+                     mappings['Junction_Detail'][record['Junction_Detail']],
+                     mappings['Local_Authority_(District)'][record['Local_Authority_(District)']],
+                     mappings['Light_Conditions'][record['Light_Conditions']],
+                     mappings['Road_Surface_Conditions'][record['Road_Surface_Conditions']],
+                     mappings['Road_Type'][record['Road_Type']],
+                     mappings['Urban_or_Rural_Area'][record['Urban_or_Rural_Area']],
+                     mappings['Vehicle_Type'][record['Vehicle_Type']]]).reshape(1, -1)
+
+
+def best_of(function, number, repeat=5):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    encoder = FeatureEncoder()
+    frame = random_frame(100_000)
+    records = frame.head(1_000).to_dict('records')
+
+    # Both implementations must agree before their timings mean anything
+    expected = np.vstack([legacy_preprocess(record) for record in records])
+    np.testing.assert_allclose(np.vstack([encoder.encode_record(record) for record in records]), expected)
+    np.testing.assert_allclose(encoder.encode_frame(frame.head(1_000)), expected)
+
+    record = records[0]
+    legacy_single = best_of(lambda: legacy_preprocess(record), 2_000)
+    encoder_single = best_of(lambda: encoder.encode_record(record), 2_000)
+    print(f'single record   legacy {legacy_single * 1e6:9.1f} us   encoder {encoder_single * 1e6:9.1f} us'
+          f'   x{legacy_single / encoder_single:.1f}')
+
+    for rows in (1_000, 100_000):
+        batch = frame.head(rows)
+        batch_records = batch.to_dict('records')
+        legacy_batch = best_of(lambda: [legacy_preprocess(r) for r in batch_records], 1, repeat=3)
+        encoder_batch = best_of(lambda: encoder.encode_frame(batch), 1, repeat=3)
+        print(f'{rows:>7,} rows    legacy {legacy_batch * 1e3:9.1f} ms   encoder {encoder_batch * 1e3:9.1f} ms'
+              f'   x{legacy_batch / encoder_batch:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Benchmark: compiled tree traversal against sklearn's predict_proba.
+
+Loads the model through the artifact store (set MODEL_SOURCE to a local
+pickle to run offline), checks that the compiled engine matches sklearn and
+times both for batch sizes from 1 to 100k rows:
+
+    python benchmarks/bench_tree_engine.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import load_model_objects
+from features import FeatureEncoder
+from tree_engine import CompiledForest, max_difference
+from workload import random_frame
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+
+
+def best_of(function, rows):
+    # Fewer repeats for the big batches so the whole run stays short
+    number = max(1, 1_000 // rows)
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+
+def main():
+    objects, _ = load_model_objects()
+    model = objects['model']
+    try:
+        engine = CompiledForest(model)
+    except (AttributeError, ValueError) as error:
+        raise SystemExit(f'{type(model).__name__} cannot be compiled ({error}); sklearn is used as is')
+
+    X = FeatureEncoder.from_objects(objects).encode_frame(random_frame(max(BATCH_SIZES)))
+    difference = max_difference(model, engine, X)
+    print(f'{type(model).__name__}: {engine.n_trees} trees, depth {engine.max_depth}, '
+          f'max |difference| {difference:.2e}')
+
+    print(f'{"rows":>8}  {"sklearn":>10}  {"compiled":>10}  {"speed-up":>8}')
+    for rows in BATCH_SIZES:
+        batch = X[:rows]
+        sklearn_time = best_of(lambda: model.predict_proba(batch), rows)
+        engine_time = best_of(lambda: engine.traverse(batch), rows)
+        print(f'{rows:>8,}  {sklearn_time * 1e3:8.2f}ms  {engine_time * 1e3:8.2f}ms  {sklearn_time / engine_time:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Load test for serve.py: throughput and latency with and without batching.
+
+Starts the scoring service twice, once with batching disabled and once with
+the given batch window, sends the same concurrent load to each and prints
+requests per second and p50/p99 latency. The model comes from the artifact
+store, so set MODEL_SOURCE to a local pickle to run offline:
+
+    MODEL_SOURCE=my_pickle_file.pkl python benchmarks/load_test_serve.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from workload import random_frame
+
+
+def start_server(port, window_ms, max_batch_size):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'serve.py'), '--port', str(port),
+         '--batch-window-ms', str(window_ms), '--max-batch-size', str(max_batch_size)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    # serve.py prints one line once it is listening
+    process.stdout.readline()
+    return process
+
+
+async def run_load(url, bodies, concurrency):
+    AsyncHTTPClient.configure(None, max_clients=concurrency)
+    client = AsyncHTTPClient()
+    latencies = []
+    next_body = iter(bodies)
+
+    async def worker():
+        for body in next_body:
+            started = time.perf_counter()
+            try:
+                await client.fetch(url, method='POST', body=body)
+            except HTTPClientError as error:
+                raise SystemExit(f'Request failed: {error}')
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5_000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--batch-window-ms', type=float, default=5.0)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--port', type=int, default=8599)
+    args = parser.parse_args()
+
+    bodies = [json.dumps(record) for record in random_frame(args.requests).to_dict('records')]
+    url = f'http://127.0.0.1:{args.port}/predict'
+
+    print(f'{args.requests:,} requests, concurrency {args.concurrency}')
+    for name, window_ms in (('no batching', 0), (f'batching {args.batch_window_ms:g} ms', args.batch_window_ms)):
+        server = start_server(args.port, window_ms, args.max_batch_size)
+        try:
+            # Warm up connections and the model before measuring
+            asyncio.run(run_load(url, bodies[:args.concurrency], args.concurrency))
+            throughput, latencies = asyncio.run(run_load(url, bodies, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f'{name:<20} {throughput:9.0f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
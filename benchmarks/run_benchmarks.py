@@ -0,0 +1,191 @@
+"""Benchmark suite for the prediction pipeline.
+
+Times each stage on its own and writes the results to a JSON file:
+
+  artifact/*        fetching, unpickling and reloading the model (download_model)
+  preprocess/*      encoding one record (preprocess_inputs) and whole frames
+  predict_proba/*   sklearn and the compiled engine for 1 to 1M rows
+  import/*          cold start of a fresh process importing app.py
+
+The model comes from MODEL_SOURCE. When it cannot be loaded (e.g. no network
+for the Google Drive artifact), or with --standin, a small random forest is
+trained locally instead, so the suite always runs offline.
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+With --compare, stages more than --tolerance slower than the earlier run are
+listed and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+import sklearn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from artifacts import MODEL_SOURCE, load_model_objects, local_source_path
+from features import FeatureEncoder
+from tree_engine import compile_model
+from workload import random_frame, train_standin_model
+
+BATCH_SIZES = [1, 100, 10_000, 1_000_000]
+
+
+def best_of(function, repeat=3):
+    # Fast calls are looped enough times to be measurable, calls of a second
+    # or more are only repeated once more
+    elapsed = timeit.timeit(function, number=1)
+    if elapsed >= 1:
+        return min(elapsed, timeit.timeit(function, number=1))
+    number = max(1, int(0.05 / max(elapsed, 1e-7)))
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def bench_artifact(source, work_dir, results):
+    # Cold: empty store, so the artifact is fetched, checksummed and unpickled;
+    # warm: the copy already in the store is reused
+    cold_dir = tempfile.mkdtemp(dir=work_dir)
+    started = time.perf_counter()
+    load_model_objects(source, None, cold_dir)
+    results['artifact/cold_load'] = time.perf_counter() - started
+    results['artifact/warm_load'] = best_of(lambda: load_model_objects(source, None, cold_dir))
+
+    local_path = local_source_path(source)
+    if local_path is not None:
+        results['artifact/size_bytes'] = os.path.getsize(local_path)
+
+        def unpickle():
+            with open(local_path, 'rb') as file:
+                pickle.load(file)
+        results['artifact/unpickle'] = best_of(unpickle)
+    return cold_dir
+
+
+def bench_preprocess(encoder, frame, results):
+    record = frame.iloc[0].to_dict()
+    results['preprocess/record'] = best_of(lambda: encoder.encode_record(record))
+    for rows in BATCH_SIZES:
+        batch = frame.head(rows)
+        results[f'preprocess/frame/{rows}'] = best_of(lambda: encoder.encode_frame(batch))
+
+
+def bench_predict(model, predictor, features, results):
+    for rows in BATCH_SIZES:
+        batch = features[:rows]
+        results[f'predict_proba/sklearn/{rows}'] = best_of(lambda: model.predict_proba(batch))
+        if predictor is not model:
+            results[f'predict_proba/compiled/{rows}'] = best_of(lambda: predictor.predict_proba(batch))
+
+
+def bench_import(source, cache_dir, results, repeat=3):
+    # A fresh interpreter each time, with the artifact already in the store,
+    # so this is the cost a new server process pays before the first page
+    env = dict(os.environ, MODEL_SOURCE=source, MODEL_CACHE_DIR=cache_dir)
+    code = 'import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)'
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        timings.append((time.perf_counter() - started, float(output.stdout.strip().splitlines()[-1])))
+    results['import/process'] = min(total for total, _ in timings)
+    results['import/app'] = min(module for _, module in timings)
+
+
+def compare(results, baseline, tolerance):
+    """Print results against an earlier run and return the stages that got slower."""
+    slower = []
+    print(f'{"stage":<34} {"before":>12} {"after":>12} {"ratio":>7}')
+    for name, value in results.items():
+        if name not in baseline or name.endswith('_bytes'):
+            continue
+        ratio = value / baseline[name] if baseline[name] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            slower.append(name)
+            flag = '  SLOWER'
+        print(f'{name:<34} {baseline[name]:12.6f} {value:12.6f} {ratio:6.2f}x{flag}')
+    return slower
+
+
+def run_suite(standin, work_dir):
+    source = MODEL_SOURCE
+    results = {}
+    if not standin:
+        try:
+            cache_dir = bench_artifact(source, work_dir, results)
+        except Exception as error:
+            print(f'Model artifact not available ({error}); training a stand-in model', file=sys.stderr)
+            standin = True
+    if standin:
+        source = train_standin_model(os.path.join(work_dir, 'standin.pkl'))
+        results = {}
+        cache_dir = bench_artifact(source, work_dir, results)
+
+    objects, _ = load_model_objects(source, None, cache_dir)
+    model = objects['model']
+    encoder = FeatureEncoder.from_objects(objects)
+    frame = random_frame(max(BATCH_SIZES))
+    bench_preprocess(encoder, frame, results)
+    bench_predict(model, compile_model(model), encoder.encode_frame(frame), results)
+    bench_import(source, cache_dir, results)
+
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'model_source': 'stand-in' if standin else source,
+            'model': type(model).__name__,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before a stage is reported, as a fraction (default 0.25)')
+    parser.add_argument('--standin', action='store_true', help='always use the locally trained stand-in model')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='benchmarks-')
+    try:
+        report = run_suite(args.standin, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
+
+    results = report['results']
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        slower = compare(results, baseline, args.tolerance)
+        if slower:
+            print(f'{len(slower)} stage(s) slower than {args.compare} by more than {args.tolerance:.0%}')
+            sys.exit(1)
+    else:
+        for name, value in results.items():
+            print(f'{name:<34} {value:12.6f}')
+
+
+if __name__ == '__main__':
+    main()
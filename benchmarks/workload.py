@@ -0,0 +1,58 @@
+"""Synthetic accident records and a small stand-in model for benchmarking.
+
+Records are drawn from the same option lists and slider ranges the app
+offers, so they exercise every category the real model can be asked about.
+"""
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features import (CATEGORICAL_OPTIONS, DAY_OF_WEEK_OPTIONS, INPUT_COLUMNS, LATITUDE_RANGE, LONGITUDE_RANGE,
+                      NUMBER_OF_CASUALTIES_RANGE, NUMBER_OF_VEHICLES_RANGE, FeatureEncoder)
+
+
+def random_frame(rows, seed=0):
+    """Return a DataFrame of ``rows`` random accident records with INPUT_COLUMNS."""
+    rng = np.random.default_rng(seed)
+    frame = {column: rng.choice(options, rows) for column, options in CATEGORICAL_OPTIONS.items()}
+    frame['Day_of_Week'] = rng.choice(DAY_OF_WEEK_OPTIONS, rows)
+    frame['Latitude'] = rng.uniform(LATITUDE_RANGE[0], LATITUDE_RANGE[1], rows)
+    frame['Longitude'] = rng.uniform(LONGITUDE_RANGE[0], LONGITUDE_RANGE[1], rows)
+    frame['Number_of_Vehicles'] = rng.integers(NUMBER_OF_VEHICLES_RANGE[0], NUMBER_OF_VEHICLES_RANGE[1] + 1, rows)
+    frame['Number_of_Casualties'] = rng.integers(NUMBER_OF_CASUALTIES_RANGE[0], NUMBER_OF_CASUALTIES_RANGE[1] + 1, rows)
+    return pd.DataFrame(frame)[INPUT_COLUMNS]
+
+
+def synthetic_labels(features, seed=0):
+    """Serious (1) / Slight (0) labels loosely tied to the features, about 15% Serious."""
+    rng = np.random.default_rng(seed)
+    # More casualties, rural roads and darkness make a Serious outcome likelier
+    score = 0.3 * features[:, 5] + 0.8 * features[:, 11] - 0.6 * features[:, 8] + rng.normal(0, 1, len(features))
+    return (score > np.quantile(score, 0.85)).astype(int)
+
+
+def train_standin_model(path, rows=20_000, n_estimators=100, max_depth=12, seed=0):
+    """Train a small random forest on synthetic data and pickle it like the real artifact.
+
+    The pickle holds the same keys as my_pickle_file.pkl, with the optional
+    encoders left empty; FeatureEncoder only checks them against its own mappings.
+    """
+    features = FeatureEncoder().encode_frame(random_frame(rows, seed))
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=seed)
+    model.fit(features, synthetic_labels(features, seed))
+    objects = {
+        'model': model,
+        'label_encoder': None,
+        'customer_category_mapping': {},
+        'day_sin_transformer': None,
+        'day_cos_transformer': None,
+    }
+    with open(path, 'wb') as file:
+        pickle.dump(objects, file)
+    return path
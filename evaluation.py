@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from batch_scoring import DEFAULT_CHUNK_SIZE, iter_chunks
+from features import INPUT_COLUMNS
+from metrics import metrics
+
+# Column holding the recorded outcome in a labelled accident file
+LABEL_COLUMN = 'Accident_Severity'
+
+# Recorded outcomes counted as Serious (1) or Slight (0). STATS19 codes severity
+# as 1 = Fatal, 2 = Serious, 3 = Slight; fatal accidents count as Serious.
+SEVERITY_LABELS = {'fatal': 1, 'serious': 1, 'slight': 0, '1': 1, '2': 1, '3': 0}
+
+# Thresholds are evaluated every 1/THRESHOLD_BINS, so 0.55 is among them
+THRESHOLD_BINS = 1_000
+
+
+def encode_labels(values):
+    """Map recorded severities to 1 (Serious) / 0 (Slight)."""
+    normalised = pd.Series(values).astype(str).str.strip().str.lower()
+    normalised = normalised.str.replace(r'\.0$', '', regex=True)
+    labels = normalised.map(SEVERITY_LABELS)
+    if labels.isna().any():
+        unknown = normalised[labels.isna()].unique()[:5]
+        raise ValueError(f"Unknown value(s) in column '{LABEL_COLUMN}': {', '.join(unknown)}")
+    return labels.to_numpy(dtype=np.int8)
+
+
+class ThresholdSweep:
+    """Confusion matrices for every threshold from one pass over the data.
+
+    Only two fixed-size histograms of the predicted probability of Serious are
+    kept, one for each recorded outcome, so memory does not depend on the
+    number of rows. A row is predicted Serious at threshold t when its
+    probability is >= t, as in the app.
+    """
+
+    def __init__(self, bins=THRESHOLD_BINS):
+        self.bins = bins
+        self.thresholds = np.arange(bins + 1) / bins
+        # One extra bin for probabilities of exactly 1
+        self.serious_counts = np.zeros(bins + 1, dtype=np.int64)
+        self.slight_counts = np.zeros(bins + 1, dtype=np.int64)
+
+    @property
+    def rows(self):
+        return int(self.serious_counts.sum() + self.slight_counts.sum())
+
+    def update(self, labels, probability_serious):
+        probability_serious = np.clip(np.asarray(probability_serious, dtype=np.float64), 0, 1)
+        bin_index = np.floor(probability_serious * self.bins).astype(np.intp)
+        # The multiplication can round a probability just below a threshold up
+        # onto it (or the reverse); move those rows so that every row in bin k
+        # satisfies thresholds[k] <= p < thresholds[k + 1], as p >= t does
+        bin_index -= probability_serious < self.thresholds[bin_index]
+        next_index = np.minimum(bin_index + 1, self.bins)
+        bin_index += (bin_index < self.bins) & (probability_serious >= self.thresholds[next_index])
+        labels = np.asarray(labels, dtype=bool)
+        self.serious_counts += np.bincount(bin_index[labels], minlength=self.bins + 1)
+        self.slight_counts += np.bincount(bin_index[~labels], minlength=self.bins + 1)
+
+    def results(self):
+        """Return a DataFrame with the confusion matrix and scores for every threshold."""
+        # Rows at or above each threshold, from the top bin down
+        tp = self.serious_counts[::-1].cumsum()[::-1]
+        fp = self.slight_counts[::-1].cumsum()[::-1]
+        fn = self.serious_counts.sum() - tp
+        tn = self.slight_counts.sum() - fp
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+            recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+            accuracy = (tp + tn) / max(self.rows, 1)
+        return pd.DataFrame({
+            'threshold': self.thresholds,
+            'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+            'precision': precision, 'recall': recall, 'f1': f1, 'accuracy': accuracy,
+        })
+
+
+def evaluate_file(model, encoder, file, file_name, chunk_size=DEFAULT_CHUNK_SIZE, bins=THRESHOLD_BINS, progress=None):
+    """Score a labelled accident file chunk by chunk and return its ThresholdSweep.
+
+    ``progress`` is called with the fraction of the file processed and the
+    number of rows evaluated so far.
+    """
+    sweep = ThresholdSweep(bins)
+    for chunk, fraction_done in iter_chunks(file, file_name, chunk_size, INPUT_COLUMNS + [LABEL_COLUMN]):
+        labels = encode_labels(chunk[LABEL_COLUMN])
+        with metrics.timer('evaluation_chunk_seconds'):
+            probability_serious = model.predict_proba(encoder.encode_frame(chunk))[:, 1]
+        sweep.update(labels, probability_serious)
+        metrics.increment('evaluation_rows_total', len(chunk))
+        if progress is not None:
+            progress(fraction_done, sweep.rows)
+    return sweep
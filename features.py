@@ -0,0 +1,319 @@
+import math
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Feature definitions shared by the interactive app and the batch scorer.
+# The option lists are the values offered by the widgets in app.py, the
+# mappings are the integer codes the model was trained on.
+
+JUNCTION_DETAIL_OPTIONS = ['Crossroads', 'Mini-roundabout', 'More than 4 arms (not roundabout)', 'Not at junction or within 20 metres', 'Other junction',
+                           'Private drive or entrance', 'Roundabout', 'Slip road', 'T or staggered junction']
+
+LOCAL_AUTHORITY_OPTIONS = [
+    'Aberdeen City', 'Aberdeenshire', 'Adur', 'Allerdale', 'Alnwick', 'Amber Valley', 'Angus', 'Argyll and Bute', 'Arun', 'Ashfield',
+    'Ashford', 'Aylesbury Vale', 'Babergh', 'Barking and Dagenham', 'Barnet', 'Barnsley', 'Barrow-in-Furness', 'Basildon', 'Basingstoke and Deane', 'Bassetlaw',
+    'Bath and North East Somerset', 'Bedford', 'Berwick-upon-Tweed', 'Bexley', 'Birmingham', 'Blaby', 'Blackburn with Darwen', 'Blackpool', 'Blaenau Gwent', 'Blyth Valley',
+    'Bolsover', 'Bolton', 'Boston', 'Bournemouth', 'Bracknell Forest', 'Bradford', 'Braintree', 'Breckland', 'Brent', 'Brentwood',
+    'Bridgend', 'Bridgnorth', 'Brighton and Hove', 'Bristol, City of', 'Broadland', 'Bromley', 'Bromsgrove', 'Broxbourne', 'Broxtowe', 'Burnley',
+    'Bury', 'Caerphilly', 'Calderdale', 'Cambridge', 'Camden', 'Cannock Chase', 'Canterbury', 'Caradon', 'Cardiff', 'Carlisle',
+    'Carmarthenshire', 'Carrick', 'Castle Morpeth', 'Castle Point', 'Central Bedfordshire', 'Ceredigion', 'Charnwood', 'Chelmsford', 'Cheltenham', 'Cherwell',
+    'Cheshire East', 'Cheshire West and Chester', 'Chester', 'Chester-le-Street', 'Chesterfield', 'Chichester', 'Chiltern', 'Chorley', 'Christchurch', 'City of London',
+    'Clackmannanshire', 'Colchester', 'Congleton', 'Conwy', 'Copeland', 'Corby', 'Cornwall', 'Cotswold', 'County Durham', 'Coventry',
+    'Craven', 'Crawley', 'Crewe and Nantwich', 'Croydon', 'Dacorum', 'Darlington', 'Dartford', 'Daventry', 'Denbighshire', 'Derby',
+    'Derbyshire Dales', 'Derwentside', 'Doncaster', 'Dover', 'Dudley', 'Dumfries and Galloway', 'Dundee City', 'Durham', 'Ealing', 'Easington',
+    'East Ayrshire', 'East Cambridgeshire', 'East Devon', 'East Dorset', 'East Dunbartonshire', 'East Hampshire', 'East Hertfordshire', 'East Lindsey', 'East Lothian', 'East Northamptonshire',
+    'East Renfrewshire', 'East Riding of Yorkshire', 'East Staffordshire', 'Eastbourne', 'Eastleigh', 'Eden', 'Edinburgh, City of', 'Ellesmere Port and Neston', 'Elmbridge', 'Enfield',
+    'Epping Forest', 'Epsom and Ewell', 'Erewash', 'Exeter', 'Falkirk', 'Fareham', 'Fenland', 'Fife', 'Flintshire', 'Forest Heath',
+    'Forest of Dean', 'Fylde', 'Gateshead', 'Gedling', 'Glasgow City', 'Gloucester', 'Gosport', 'Gravesham', 'Great Yarmouth', 'Greenwich',
+    'Guildford', 'Gwynedd', 'Hackney', 'Halton', 'Hambleton', 'Hammersmith and Fulham', 'Harborough', 'Haringey', 'Harlow', 'Harrogate',
+    'Harrow', 'Hart', 'Hartlepool', 'Hastings', 'Havant', 'Havering', 'Herefordshire, County of', 'Hertsmere', 'High Peak', 'Highland',
+    'Hillingdon', 'Hinckley and Bosworth', 'Horsham', 'Hounslow', 'Huntingdonshire', 'Hyndburn', 'Inverclyde', 'Ipswich', 'Isle of Anglesey', 'Isle of Wight',
+    'Islington', 'Kennet', 'Kensington and Chelsea', 'Kerrier', 'Kettering', 'Kings Lynn and West Norfolk', 'Kingston upon Hull, City of', 'Kingston upon Thames', 'Kirklees', 'Knowsley',
+    'Lambeth', 'Lancaster', 'Leeds', 'Leicester', 'Lewes', 'Lewisham', 'Lichfield', 'Lincoln', 'Liverpool', 'London Airport (Heathrow)',
+    'Luton', 'Macclesfield', 'Maidstone', 'Maldon', 'Malvern Hills', 'Manchester', 'Mansfield', 'Medway', 'Melton', 'Mendip',
+    'Merthyr Tydfil', 'Merton', 'Mid Bedfordshire', 'Mid Devon', 'Mid Suffolk', 'Mid Sussex', 'Middlesbrough', 'Midlothian', 'Milton Keynes', 'Mole Valley',
+    'Monmouthshire', 'Moray', 'Neath Port Talbot', 'New Forest', 'Newark and Sherwood', 'Newcastle upon Tyne', 'Newcastle-under-Lyme', 'Newham', 'Newport', 'North Ayrshire',
+    'North Cornwall', 'North Devon', 'North Dorset', 'North East Derbyshire', 'North East Lincolnshire', 'North Hertfordshire', 'North Kesteven', 'North Lanarkshire', 'North Larkshire', 'North Lincolnshire',
+    'North Norfolk', 'North Shropshire', 'North Somerset', 'North Tyneside', 'North Warwickshire', 'North West Leicestershire', 'North Wiltshire', 'Northampton', 'Northumberland', 'Norwich',
+    'Nottingham', 'Nuneaton and Bedworth', 'Oadby and Wigston', 'Oldham', 'Orkney Islands', 'Oswestry', 'Oxford', 'Pembrokeshire', 'Pendle', 'Penwith',
+    'Perth and Kinross', 'Peterborough', 'Plymouth', 'Poole', 'Portsmouth', 'Powys', 'Preston', 'Purbeck', 'Reading', 'Redbridge',
+    'Redcar and Cleveland', 'Redditch', 'Reigate and Banstead', 'Renfrewshire', 'Restormel', 'Rhondda, Cynon, Taff', 'Ribble Valley', 'Richmond upon Thames', 'Richmondshire', 'Rochdale',
+    'Rochford', 'Rossendale', 'Rother', 'Rotherham', 'Rugby', 'Runnymede', 'Rushcliffe', 'Rushmoor', 'Rutland', 'Ryedale',
+    'Salford', 'Salisbury', 'Sandwell', 'Scarborough', 'Scottish Borders', 'Sedgefield', 'Sedgemoor', 'Sefton', 'Selby', 'Sevenoaks',
+    'Sheffield', 'Shepway', 'Shetland Islands', 'Shrewsbury and Atcham', 'Shropshire', 'Slough', 'Solihull', 'South Ayrshire', 'South Bedfordshire', 'South Bucks',
+    'South Cambridgeshire', 'South Derbyshire', 'South Gloucestershire', 'South Hams', 'South Holland', 'South Kesteven', 'South Lakeland', 'South Lanarkshire', 'South Larkshire', 'South Norfolk',
+    'South Northamptonshire', 'South Oxfordshire', 'South Ribble', 'South Shropshire', 'South Somerset', 'South Staffordshire', 'South Tyneside', 'Southampton', 'Southend-on-Sea', 'Southwark',
+    'Spelthorne', 'St. Albans', 'St. Edmundsbury', 'St. Helens', 'Stafford', 'Staffordshire Moorlands', 'Stevenage', 'Stirling', 'Stockport', 'Stockton-on-Tees',
+    'Stoke-on-Trent', 'Stratford-upon-Avon', 'Stroud', 'Suffolk Coastal', 'Sunderland', 'Surrey Heath', 'Sutton', 'Swale', 'Swansea', 'Swindon',
+    'Tameside', 'Tamworth', 'Tandridge', 'Taunton Deane', 'Teesdale', 'Teignbridge', 'Telford and Wrekin', 'Tendring', 'Test Valley', 'Tewkesbury',
+    'Thanet', 'The Vale of Glamorgan', 'Three Rivers', 'Thurrock', 'Tonbridge and Malling', 'Torbay', 'Torfaen', 'Torridge', 'Tower Hamlets', 'Trafford',
+    'Tunbridge Wells', 'Tynedale', 'Uttlesford', 'Vale Royal', 'Vale of White Horse', 'Wakefield', 'Walsall', 'Waltham Forest', 'Wandsworth', 'Wansbeck',
+    'Warrington', 'Warwick', 'Watford', 'Waveney', 'Waverley', 'Wealden', 'Wear Valley', 'Wellingborough', 'Welwyn Hatfield', 'West Berkshire',
+    'West Devon', 'West Dorset', 'West Dunbartonshire', 'West Lancashire', 'West Lindsey', 'West Lothian', 'West Oxfordshire', 'West Somerset', 'West Wiltshire', 'Western Isles',
+    'Westminster', 'Weymouth and Portland', 'Wigan', 'Wiltshire', 'Winchester', 'Windsor and Maidenhead', 'Wirral', 'Woking', 'Wokingham', 'Wolverhampton',
+    'Worcester', 'Worthing', 'Wrexham', 'Wychavon', 'Wycombe', 'Wyre', 'Wyre Forest', 'York'
+]
+
+LIGHT_CONDITIONS_OPTIONS = ['Darkness', 'Daylight']
+
+ROAD_SURFACE_CONDITIONS_OPTIONS = ['Dry', 'Flood over 3cm. deep', 'Frost or ice', 'Snow', 'Wet or damp']
+
+ROAD_TYPE_OPTIONS = ['Dual carriageway', 'One way street', 'Roundabout', 'Single carriageway', 'Slip road']
+
+URBAN_OR_RURAL_AREA_OPTIONS = ['Urban', 'Rural']
+
+VEHICLE_TYPE_OPTIONS = ['Agricultural vehicle', 'Bus or coach (17 or more pass seats)', 'Car', 'Goods 7.5 tonnes mgw and over', 'Minibus(8 - 16 passenger seats)', 'Motorcycle 125cc and under', 'Motorcycle 50cc and under',
+                        'Motorcycle over 125cc and up to 500cc', 'Motorcycle over 500cc', 'Other vehicle', 'Pedal cycle', 'Ridden horse', 'Taxi/Private hire car',
+                        'Van / Goods 3.5 tonnes mgw or under', 'Goods over 3.5t. and under 7.5t']
+
+DAY_OF_WEEK_OPTIONS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Slider ranges as (min, max, default)
+LATITUDE_RANGE = (49.914488, 60.598055, 57.187246)
+LONGITUDE_RANGE = (-7.516225, 1.759398, -2.168717)
+NUMBER_OF_CASUALTIES_RANGE = (1, 10, 1)
+NUMBER_OF_VEHICLES_RANGE = (1, 8, 1)
+
+# Map categorical features
+JUNCTION_DETAIL_MAPPING = {'Crossroads':0,
+                           'Mini-roundabout':1,
+                           'More than 4 arms (not roundabout)':2,
+                           'Not at junction or within 20 metres':3,
+                           'Other junction':4,
+                           'Private drive or entrance':5,
+                           'Roundabout':6,
+                           'Slip road':7,
+                           'T or staggered junction':8}
+
+LIGHT_CONDITIONS_MAPPING = {'Darkness':0, 'Daylight':1}
+
+ROAD_SURFACE_CONDITIONS_MAPPING = {'Dry':0, 'Flood over 3cm. deep':1, 'Frost or ice':2, 'Snow':3, 'Wet or damp':4}
+
+ROAD_TYPE_MAPPING = {'Dual carriageway':0, 'One way street':1, 'Roundabout':2, 'Single carriageway':3, 'Slip road':4}
+
+URBAN_OR_RURAL_AREA_MAPPING = {'Urban':0, 'Rural':1}
+
+VEHICLE_TYPE_MAPPING = {'Agricultural vehicle':0, 'Bus or coach (17 or more pass seats)':1, 'Car':2, 'Goods 7.5 tonnes mgw and over':3, 'Goods over 3.5t. and under 7.5t':4, 'Minibus(8 - 16 passenger seats)':5,
+                        'Motorcycle 125cc and under':6, 'Motorcycle 50cc and under':7,'Motorcycle over 125cc and up to 500cc':8, 'Motorcycle over 500cc':9, 'Other vehicle':10,
+                        'Pedal cycle':11, 'Ridden horse':12, 'Taxi/Private hire car':13, 'Van / Goods 3.5 tonnes mgw or under':14}
+
+DAY_OF_WEEK_MAPPING = {day: index for index, day in enumerate(DAY_OF_WEEK_OPTIONS)}
+
+# The district codes are the alphabetical position of each district, which is
+# exactly the order of the widget options
+LOCAL_AUTHORITY_MAPPING = {name: code for code, name in enumerate(LOCAL_AUTHORITY_OPTIONS)}
+
+DAYS_IN_WEEK = len(DAY_OF_WEEK_OPTIONS)
+
+# Columns expected in an uploaded accident file (STATS19 naming)
+INPUT_COLUMNS = ['Day_of_Week', 'Latitude', 'Longitude', 'Number_of_Vehicles', 'Number_of_Casualties',
+                 'Junction_Detail', 'Local_Authority_(District)', 'Light_Conditions',
+                 'Road_Surface_Conditions', 'Road_Type', 'Urban_or_Rural_Area', 'Vehicle_Type']
+
+# Order of the 13 columns the model was trained on
+FEATURE_COLUMNS = ['Day_sin', 'Day_cos', 'Latitude', 'Longitude', 'Number_of_Vehicles', 'Number_of_Casualties',
+                   'Junction_Detail', 'Local_Authority_(District)', 'Light_Conditions',
+                   'Road_Surface_Conditions', 'Road_Type', 'Urban_or_Rural_Area', 'Vehicle_Type']
+
+# Model features taken as numbers straight from the input
+NUMERIC_COLUMNS = FEATURE_COLUMNS[2:6]
+
+# Model features encoded from a category name
+CATEGORICAL_COLUMNS = FEATURE_COLUMNS[6:]
+
+CATEGORICAL_MAPPINGS = {
+    'Junction_Detail': JUNCTION_DETAIL_MAPPING,
+    'Local_Authority_(District)': LOCAL_AUTHORITY_MAPPING,
+    'Light_Conditions': LIGHT_CONDITIONS_MAPPING,
+    'Road_Surface_Conditions': ROAD_SURFACE_CONDITIONS_MAPPING,
+    'Road_Type': ROAD_TYPE_MAPPING,
+    'Urban_or_Rural_Area': URBAN_OR_RURAL_AREA_MAPPING,
+    'Vehicle_Type': VEHICLE_TYPE_MAPPING,
+}
+
+# Values offered by the widgets for each categorical column
+CATEGORICAL_OPTIONS = {
+    'Junction_Detail': JUNCTION_DETAIL_OPTIONS,
+    'Local_Authority_(District)': LOCAL_AUTHORITY_OPTIONS,
+    'Light_Conditions': LIGHT_CONDITIONS_OPTIONS,
+    'Road_Surface_Conditions': ROAD_SURFACE_CONDITIONS_OPTIONS,
+    'Road_Type': ROAD_TYPE_OPTIONS,
+    'Urban_or_Rural_Area': URBAN_OR_RURAL_AREA_OPTIONS,
+    'Vehicle_Type': VEHICLE_TYPE_OPTIONS,
+}
+
+
+def _day_table(function):
+    # Cyclical encoding of the day index, which is the position in
+    # DAY_OF_WEEK_OPTIONS (Monday = 0) as in the app's original preprocessing
+    return function(2 * np.pi * np.arange(DAYS_IN_WEEK, dtype=np.float64) / DAYS_IN_WEEK)
+
+
+def _pickled_mappings(label_encoder, customer_category_mapping):
+    # Collect category mappings stored in the pickle, keyed by column. The
+    # label encoder is matched to the column whose options are its classes.
+    mappings = {}
+    if isinstance(customer_category_mapping, dict):
+        for column, mapping in customer_category_mapping.items():
+            if column in CATEGORICAL_OPTIONS and isinstance(mapping, dict):
+                mappings[column] = mapping
+    classes = getattr(label_encoder, 'classes_', None)
+    if classes is not None:
+        for column, options in CATEGORICAL_OPTIONS.items():
+            if column not in mappings and set(options) == set(classes):
+                mappings[column] = {name: code for code, name in enumerate(classes)}
+    return mappings
+
+
+def _mapping_disagreement(column, mapping):
+    # Describe where a pickled mapping differs from the hand-written one, or return None
+    expected = CATEGORICAL_MAPPINGS[column]
+    differing = [name for name in CATEGORICAL_OPTIONS[column] if mapping.get(name) != expected[name]]
+    if not differing:
+        return None
+    name = differing[0]
+    return (f"Mapping for '{column}' in the model pickle disagrees with features.py on {len(differing)} "
+            f"value(s), e.g. {name!r} is {mapping.get(name)} in the pickle and {expected[name]} here")
+
+
+def _day_disagreement(name, transformer, function):
+    # Describe where a pickled day transformer differs from the sin/cos table, or return None
+    if transformer is None or not hasattr(transformer, 'transform'):
+        return None
+    day_index = np.arange(DAYS_IN_WEEK, dtype=np.float64).reshape(-1, 1)
+    try:
+        table = np.asarray(transformer.transform(day_index), dtype=np.float64).ravel()
+    except (TypeError, ValueError) as error:
+        return f'{name} in the model pickle cannot encode the day index: {error}'
+    if table.shape != (DAYS_IN_WEEK,) or not np.allclose(table, _day_table(function)):
+        return (f'{name} in the model pickle does not match the encoding of Monday=0 .. Sunday=6 '
+                f'used by features.py')
+    return None
+
+
+class FeatureEncoder:
+    """Turns raw accident records into the 13 model features.
+
+    Built once from the pickled objects; all lookups are precomputed so a single
+    record or a whole DataFrame is encoded without rebuilding any mapping.
+    """
+
+    def __init__(self, mappings=None):
+        mappings = {**CATEGORICAL_MAPPINGS, **(mappings or {})}
+        self.day_sin_table = _day_table(np.sin)
+        self.day_cos_table = _day_table(np.cos)
+
+        # For each column: an index of the widget options and the model code
+        # of each option, in the same order
+        self.options = {}
+        self.codes = {}
+        self.mappings = {}
+        for column, options in CATEGORICAL_OPTIONS.items():
+            mapping = mappings[column]
+            self._check_mapping(column, options, mapping)
+            self.options[column] = pd.Index(options)
+            self.codes[column] = np.array([mapping[name] for name in options], dtype=np.float64)
+            self.mappings[column] = {name: float(mapping[name]) for name in options}
+        self.options['Day_of_Week'] = pd.Index(DAY_OF_WEEK_OPTIONS)
+
+    @classmethod
+    def from_objects(cls, objects):
+        """Build the encoder for the dict loaded from the model pickle.
+
+        The encoding is always the one in this module, which the model has been
+        served with. Mappings and day transformers found in the pickle are only
+        compared with it, and each one that disagrees is reported with a warning.
+        """
+        disagreements = [
+            _mapping_disagreement(column, mapping)
+            for column, mapping in _pickled_mappings(objects.get('label_encoder'),
+                                                     objects.get('customer_category_mapping')).items()
+        ]
+        disagreements.append(_day_disagreement('day_sin_transformer', objects.get('day_sin_transformer'), np.sin))
+        disagreements.append(_day_disagreement('day_cos_transformer', objects.get('day_cos_transformer'), np.cos))
+        for message in filter(None, disagreements):
+            warnings.warn(f'{message}; keeping the encoding in features.py')
+        return cls()
+
+    @staticmethod
+    def _check_mapping(column, options, mapping):
+        # Every widget option needs a code, and the codes must be 0..n-1 with
+        # no duplicates, whatever order the options are shown in
+        missing = [name for name in options if name not in mapping]
+        if missing:
+            raise ValueError(f"No code for option(s) of '{column}': {', '.join(missing)}")
+        codes = sorted(mapping[name] for name in options)
+        if codes != list(range(len(options))):
+            raise ValueError(f"Codes for '{column}' are not 0..{len(options) - 1} without gaps or duplicates")
+
+    def _lookup(self, column, values):
+        positions = self.options[column].get_indexer(values)
+        if (positions < 0).any():
+            unknown = pd.unique(np.asarray(values, dtype=object)[positions < 0])[:5]
+            raise ValueError(f"Unknown value(s) in column '{column}': {', '.join(map(str, unknown))}")
+        return positions
+
+    @staticmethod
+    def _code(mapping, column, value):
+        # Unhashable values (e.g. a list from JSON) are unknown values too
+        try:
+            return mapping[value]
+        except (KeyError, TypeError):
+            raise ValueError(f"Unknown value in column '{column}': {value!r}") from None
+
+    @staticmethod
+    def _number(column, value):
+        # Booleans are rejected even though float() accepts them
+        if value is None or isinstance(value, bool):
+            number = None
+        else:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                number = None
+        if number is None or not math.isfinite(number):
+            raise ValueError(f"Missing or non-numeric value in column '{column}': {value!r}")
+        return number
+
+    @staticmethod
+    def _numbers(column, values):
+        # Blank cells and text become NaN here, and are rejected with infinities
+        numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+        invalid = ~np.isfinite(numbers)
+        if invalid.any():
+            examples = pd.unique(np.asarray(values, dtype=object)[invalid])[:5]
+            raise ValueError(f"{invalid.sum():,} missing or non-numeric value(s) in column '{column}': "
+                             f"{', '.join(map(str, examples))}")
+        return numbers
+
+    def encode_record(self, record):
+        """Encode one record (a dict keyed by INPUT_COLUMNS) into a (1, 13) array."""
+        try:
+            day_index = self._code(DAY_OF_WEEK_MAPPING, 'Day_of_Week', record['Day_of_Week'])
+            row = [self.day_sin_table[day_index], self.day_cos_table[day_index]]
+            for column in NUMERIC_COLUMNS:
+                row.append(self._number(column, record[column]))
+            for column in CATEGORICAL_COLUMNS:
+                row.append(self._code(self.mappings[column], column, record[column]))
+        except KeyError as error:
+            raise ValueError(f'Missing column: {error}') from None
+        return np.array([row], dtype=np.float64)
+
+    def encode_frame(self, frame):
+        """Encode a DataFrame with INPUT_COLUMNS into an (n, 13) array."""
+        missing = [column for column in INPUT_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+        features = np.empty((len(frame), len(FEATURE_COLUMNS)), dtype=np.float64)
+        day_index = self._lookup('Day_of_Week', frame['Day_of_Week'])
+        features[:, 0] = self.day_sin_table[day_index]
+        features[:, 1] = self.day_cos_table[day_index]
+        for i, column in enumerate(FEATURE_COLUMNS[2:], start=2):
+            if column in self.codes:
+                features[:, i] = self.codes[column][self._lookup(column, frame[column])]
+            else:
+                features[:, i] = self._numbers(column, frame[column])
+        return features
@@ -0,0 +1,126 @@
+import base64
+import io
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from features import FEATURE_COLUMNS, LATITUDE_RANGE, LONGITUDE_RANGE
+
+# Spacing in degrees of the finest lattice the map is computed on. Coarser
+# maps take every n-th lattice point, so every resolution shares the same cells.
+BASE_STEP = 0.01
+
+# Number of input combinations whose grids are kept (about 4 MB each)
+MAX_GRIDS = 16
+
+# Cells scored per predict_proba call while filling a grid
+FILL_CHUNK_ROWS = 50_000
+
+_LATITUDE = FEATURE_COLUMNS.index('Latitude')
+_LONGITUDE = FEATURE_COLUMNS.index('Longitude')
+
+
+class HeatmapCache:
+    """Probability of Serious over a lat/long lattice covering the whole UK.
+
+    One grid is kept per combination of the non-geographic inputs (and model
+    checksum), with NaN for cells not yet scored. A map request only scores
+    the missing cells in its view, in vectorized batches, so panning or
+    changing resolution reuses everything computed before.
+    """
+
+    def __init__(self, max_grids=MAX_GRIDS, base_step=BASE_STEP):
+        self.max_grids = max_grids
+        self.base_step = base_step
+        self.latitudes = np.arange(LATITUDE_RANGE[0], LATITUDE_RANGE[1] + base_step / 2, base_step)
+        self.longitudes = np.arange(LONGITUDE_RANGE[0], LONGITUDE_RANGE[1] + base_step / 2, base_step)
+        self._grids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _grid_for(self, key):
+        with self._lock:
+            grid = self._grids.get(key)
+            if grid is None:
+                grid = np.full((len(self.latitudes), len(self.longitudes)), np.nan, dtype=np.float32)
+                self._grids[key] = grid
+                if len(self._grids) > self.max_grids:
+                    self._grids.popitem(last=False)
+            self._grids.move_to_end(key)
+            return grid
+
+    def _view(self, bounds, coordinates, stride):
+        # Lattice indices inside bounds, aligned to the stride so a given
+        # resolution always lands on the same cells
+        start = max(0, math.ceil((bounds[0] - coordinates[0]) / self.base_step - 1e-9))
+        stop = min(len(coordinates) - 1, math.floor((bounds[1] - coordinates[0]) / self.base_step + 1e-9))
+        start = -(-start // stride) * stride
+        if start > stop:
+            # No lattice point at this stride falls in a range this narrow, so
+            # use the one nearest its centre rather than an empty view
+            centre = (bounds[0] + bounds[1]) / 2
+            nearest = round((centre - coordinates[0]) / (self.base_step * stride)) * stride
+            return np.array([min(max(nearest, 0), (len(coordinates) - 1) // stride * stride)])
+        return np.arange(start, stop + 1, stride)
+
+    def probabilities(self, predictor, features, model_checksum, step, latitude_bounds=LATITUDE_RANGE[:2],
+                      longitude_bounds=LONGITUDE_RANGE[:2], progress=None):
+        """Return (latitudes, longitudes, probabilities) for the cells in view.
+
+        ``features`` is the encoded (1, 13) row for the chosen inputs; its
+        latitude and longitude are replaced by each cell's. ``step`` is the cell
+        spacing in degrees, rounded to a multiple of BASE_STEP. ``progress`` is
+        called with the fraction of missing cells scored so far.
+
+        The view always holds at least one cell: a range containing no lattice
+        point at that spacing gets the point nearest its centre.
+        """
+        features = np.asarray(features, dtype=np.float64).reshape(1, -1)
+        fixed = np.delete(features[0], [_LATITUDE, _LONGITUDE])
+        grid = self._grid_for((model_checksum, tuple(fixed.tolist())))
+
+        stride = max(1, round(step / self.base_step))
+        rows = self._view(latitude_bounds, self.latitudes, stride)
+        columns = self._view(longitude_bounds, self.longitudes, stride)
+        view = grid[np.ix_(rows, columns)]
+
+        missing_rows, missing_columns = np.nonzero(np.isnan(view))
+        missing_rows, missing_columns = rows[missing_rows], columns[missing_columns]
+        for start in range(0, len(missing_rows), FILL_CHUNK_ROWS):
+            chunk_rows = missing_rows[start:start + FILL_CHUNK_ROWS]
+            chunk_columns = missing_columns[start:start + FILL_CHUNK_ROWS]
+            batch = np.repeat(features, len(chunk_rows), axis=0)
+            batch[:, _LATITUDE] = self.latitudes[chunk_rows]
+            batch[:, _LONGITUDE] = self.longitudes[chunk_columns]
+            grid[chunk_rows, chunk_columns] = predictor.predict_proba(batch)[:, 1]
+            if progress is not None:
+                progress(min(1.0, (start + len(chunk_rows)) / len(missing_rows)))
+
+        return self.latitudes[rows], self.longitudes[columns], grid[np.ix_(rows, columns)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'grids': len(self._grids),
+                'max_grids': self.max_grids,
+                'cells_scored': int(sum(np.count_nonzero(~np.isnan(grid)) for grid in self._grids.values())),
+            }
+
+
+def to_image_url(probabilities, opacity=160):
+    """Render a probability grid as a PNG data URL, green (Slight) to red (Serious).
+
+    Row 0 of the grid is the southernmost latitude, so it is flipped to put
+    north at the top of the image.
+    """
+    values = np.nan_to_num(probabilities[::-1], nan=0.0).clip(0, 1)
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = (255 * values).astype(np.uint8)
+    rgba[..., 1] = (255 * (1 - values)).astype(np.uint8)
+    rgba[..., 2] = 0
+    rgba[..., 3] = opacity
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
@@ -0,0 +1,138 @@
+import bisect
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+
+# Set METRICS_ENABLED=0 to turn all timers and counters into no-ops
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# Upper bounds in seconds of the cumulative latency buckets (Prometheus style)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Recent samples kept per histogram for the rolling percentiles
+ROLLING_WINDOW = 1_000
+
+_PREFIX = 'accident_severity_'
+
+
+def resident_memory_bytes():
+    """Current resident set size of this process, or the peak where that is unavailable."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class _Histogram:
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = [0.0] * ROLLING_WINDOW
+        self.position = 0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent[self.position % ROLLING_WINDOW] = value
+        self.position += 1
+
+    def summary(self):
+        recent = np.array(self.recent[:min(self.position, ROLLING_WINDOW)])
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if len(recent) else (0.0, 0.0, 0.0)
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else 0.0,
+                'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+class Metrics:
+    """Process-wide timers, counters and gauges.
+
+    Each call is a lock, a perf_counter read and a few additions, cheap
+    enough to leave on. When disabled every method returns immediately.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = _Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def _timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timer(self, name):
+        """Context manager recording the time spent in its block under ``name``."""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timer(name)
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serialisable dict."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'latencies': {name: histogram.summary() for name, histogram in self.histograms.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f'# TYPE {_PREFIX}{name} counter', f'{_PREFIX}{name} {value}']
+            for name, value in sorted(self.gauges.items()):
+                lines += [f'# TYPE {_PREFIX}{name} gauge', f'{_PREFIX}{name} {value}']
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {_PREFIX}{name} histogram')
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{_PREFIX}{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines += [f'{_PREFIX}{name}_sum {histogram.sum}', f'{_PREFIX}{name}_count {histogram.count}']
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by everything in the process: the app, batch scoring and serve.py
+metrics = Metrics()
@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from features import FEATURE_COLUMNS
+from metrics import metrics
+
+# Maximum number of cached predictions before the least recently used is dropped
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10_000))
+
+# Decimal places latitude and longitude are rounded to before lookup and
+# prediction; 3 places is roughly 100 m
+PREDICTION_CACHE_PRECISION = int(os.environ.get('PREDICTION_CACHE_PRECISION', 3))
+
+_COORDINATE_COLUMNS = [FEATURE_COLUMNS.index('Latitude'), FEATURE_COLUMNS.index('Longitude')]
+
+
+class PredictionCache:
+    """Bounded LRU cache of model probabilities keyed on the encoded features.
+
+    Everything except latitude and longitude is discrete, so repeated
+    predictions for the same inputs are served without calling the model.
+    The cache empties itself when it is used with a different model checksum.
+    Safe to share between Streamlit sessions (threads).
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, precision=PREDICTION_CACHE_PRECISION):
+        self.maxsize = maxsize
+        self.precision = precision
+        self.model_checksum = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def round_features(self, features):
+        """Return a copy of an (n, 13) feature array with rounded coordinates."""
+        features = np.array(features, dtype=np.float64, ndmin=2)
+        features[:, _COORDINATE_COLUMNS] = features[:, _COORDINATE_COLUMNS].round(self.precision)
+        return features
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def predict_proba(self, model, features, model_checksum):
+        """Return model.predict_proba(features) using cached rows where possible.
+
+        Rows not in the cache are predicted together in one call.
+        """
+        features = self.round_features(features)
+        keys = [tuple(row) for row in features.tolist()]
+        results = [None] * len(keys)
+
+        with self._lock:
+            if model_checksum != self.model_checksum:
+                self._entries.clear()
+                self.model_checksum = model_checksum
+            for i, key in enumerate(keys):
+                probabilities = self._entries.get(key)
+                if probabilities is not None:
+                    self._entries.move_to_end(key)
+                    results[i] = probabilities
+                    self.hits += 1
+            missing = [i for i, probabilities in enumerate(results) if probabilities is None]
+            self.misses += len(missing)
+
+        if missing:
+            # Predict outside the lock so other sessions are not held up
+            with metrics.timer('predict_model_seconds'):
+                predicted = model.predict_proba(features[missing])
+            with self._lock:
+                for i, probabilities in zip(missing, predicted):
+                    results[i] = probabilities
+                    if model_checksum != self.model_checksum:
+                        continue
+                    self._entries[keys[i]] = probabilities.copy()
+                    self._entries.move_to_end(keys[i])
+                    if len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+
+        return np.vstack(results)
+
+    def stats(self):
+        """Return the counters as a dict, for display in the UI."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
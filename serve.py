@@ -0,0 +1,164 @@
+"""JSON scoring service for the accident severity model.
+
+Runs alongside the Streamlit app and uses the same model artifact and feature
+encoding. Start it with:
+
+    python serve.py --port 8502
+
+and POST one accident record (keys as in features.INPUT_COLUMNS) to /predict.
+Concurrent requests are collected for a short window and scored together.
+GET /metrics returns timings and counters in Prometheus text format.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+import tornado.web
+
+from artifacts import load_model_objects
+from batch_scoring import SERIOUS_THRESHOLD
+from features import FeatureEncoder
+from metrics import metrics
+from tree_engine import compile_model
+
+
+class MicroBatcher:
+    """Collects single rows and scores them with one predict_proba call.
+
+    A batch is scored ``window`` seconds after its first row arrives, or as
+    soon as it holds ``max_batch_size`` rows. A window of 0 scores every row
+    on its own.
+    """
+
+    def __init__(self, model, window=0.005, max_batch_size=64):
+        self.model = model
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._rows = []
+        self._futures = []
+        self._timer = None
+        # Batches being scored; the event loop only keeps weak references to tasks
+        self._tasks = set()
+
+    async def predict_proba(self, row):
+        if self.window <= 0:
+            probabilities = await asyncio.get_running_loop().run_in_executor(None, self._predict, row)
+            return probabilities[0]
+
+        future = asyncio.get_running_loop().create_future()
+        self._rows.append(row)
+        self._futures.append(future)
+        if len(self._rows) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _predict(self, rows):
+        with metrics.timer('serve_predict_seconds'):
+            probabilities = self.model.predict_proba(rows)
+        metrics.increment('serve_batches_total')
+        metrics.increment('serve_rows_total', len(rows))
+        return probabilities
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        rows, futures = self._rows, self._futures
+        self._rows, self._futures = [], []
+        task = asyncio.ensure_future(self._score(rows, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, rows, futures):
+        # Score in a worker thread so new requests keep queueing meanwhile
+        try:
+            probabilities = await asyncio.get_running_loop().run_in_executor(None, self._predict, np.vstack(rows))
+        except Exception as error:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, row_probabilities in zip(futures, probabilities):
+            if not future.done():
+                future.set_result(row_probabilities)
+
+
+class PredictHandler(tornado.web.RequestHandler):
+
+    def initialize(self, encoder, batcher, threshold):
+        self.encoder = encoder
+        self.batcher = batcher
+        self.threshold = threshold
+
+    async def post(self):
+        started = time.perf_counter()
+        try:
+            record = json.loads(self.request.body)
+            if not isinstance(record, dict):
+                raise ValueError('Request body must be a JSON object')
+            features = self.encoder.encode_record(record)
+        except (TypeError, ValueError) as error:
+            self.set_status(400)
+            self.write({'error': str(error)})
+            metrics.increment('serve_bad_requests_total')
+            return
+
+        probabilities = await self.batcher.predict_proba(features)
+        probability_serious = float(probabilities[1])
+        self.write({
+            'probability_slight': float(probabilities[0]),
+            'probability_serious': probability_serious,
+            'severity': 'Serious' if probability_serious >= self.threshold else 'Slight',
+        })
+        metrics.observe('serve_request_seconds', time.perf_counter() - started)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+
+    def initialize(self, model_checksum):
+        self.model_checksum = model_checksum
+
+    def get(self):
+        self.write({'status': 'ok', 'model_checksum': self.model_checksum})
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(metrics.to_prometheus())
+
+
+def make_app(objects, model_checksum, window=0.005, max_batch_size=64, threshold=SERIOUS_THRESHOLD):
+    encoder = FeatureEncoder.from_objects(objects)
+    batcher = MicroBatcher(compile_model(objects['model']), window, max_batch_size)
+    return tornado.web.Application([
+        (r'/predict', PredictHandler, dict(encoder=encoder, batcher=batcher, threshold=threshold)),
+        (r'/health', HealthHandler, dict(model_checksum=model_checksum)),
+        (r'/metrics', MetricsHandler),
+    ])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--batch-window-ms', type=float, default=5.0,
+                        help='how long to collect requests before scoring them; 0 disables batching')
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--threshold', type=float, default=SERIOUS_THRESHOLD,
+                        help='probability of Serious at or above which the label is Serious')
+    args = parser.parse_args()
+
+    objects, model_checksum = load_model_objects()
+    app = make_app(objects, model_checksum, args.batch_window_ms / 1000, args.max_batch_size, args.threshold)
+    app.listen(args.port)
+    print(f'Scoring service listening on port {args.port}', flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
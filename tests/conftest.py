@@ -0,0 +1,19 @@
+import os
+import pickle
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from workload import train_standin_model
+
+
+@pytest.fixture(scope='session')
+def standin_objects(tmp_path_factory):
+    """Objects of a small locally trained model, pickled like the real artifact."""
+    path = train_standin_model(str(tmp_path_factory.mktemp('model') / 'standin.pkl'), rows=5_000, n_estimators=20)
+    with open(path, 'rb') as file:
+        return pickle.load(file)
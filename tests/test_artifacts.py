@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import pytest
+
+import artifacts
+from artifacts import load_model_objects
+
+pytestmark = pytest.mark.filterwarnings('ignore:No pinned checksum')
+
+URL = 'https://example.com/model.pkl'
+
+
+def write_model(path, version):
+    with open(path, 'wb') as file:
+        pickle.dump({'model': f'model {version}'}, file)
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """A fake remote source; set remote['path'] to change what it serves, or None to make it unreachable."""
+    state = {'path': tmp_path / 'remote.pkl', 'downloads': 0}
+    state['checksum'] = write_model(state['path'], 1)
+
+    def download(url, path, quiet):
+        if state['path'] is None:
+            raise ConnectionError('unreachable')
+        state['downloads'] += 1
+        shutil.copyfile(state['path'], path)
+    monkeypatch.setattr(artifacts.gdown, 'download', download)
+    return state
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+
+def read_index(cache_dir):
+    with open(f'{cache_dir}/index.json') as file:
+        return json.load(file)
+
+
+@pytest.mark.parametrize('as_url', [False, True])
+def test_local_source_is_stored_under_its_checksum(tmp_path, cache_dir, as_url):
+    path = tmp_path / 'model.pkl'
+    checksum = write_model(path, 1)
+    source = path.as_uri() if as_url else str(path)
+
+    objects, loaded_checksum = load_model_objects(source, None, cache_dir)
+    assert objects == {'model': 'model 1'} and loaded_checksum == checksum
+    assert read_index(cache_dir)[source]['checksum'] == checksum
+
+    # A changed local file is picked up straight away
+    new_checksum = write_model(path, 2)
+    objects, loaded_checksum = load_model_objects(source, None, cache_dir)
+    assert objects == {'model': 'model 2'} and loaded_checksum == new_checksum
+    assert read_index(cache_dir)[source]['checksum'] == new_checksum
+
+
+def test_pinned_checksum_is_fetched_once(remote, cache_dir):
+    for _ in range(3):
+        objects, checksum = load_model_objects(URL, remote['checksum'], cache_dir)
+    assert objects == {'model': 'model 1'} and checksum == remote['checksum']
+    assert remote['downloads'] == 1
+
+
+def test_pinned_checksum_mismatch_is_rejected(remote, cache_dir):
+    with pytest.raises(ValueError, match='expected 0+'):
+        load_model_objects(URL, '0' * 64, cache_dir)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith('.pkl')]
+
+
+def test_corrupted_copy_is_fetched_again(remote, cache_dir):
+    load_model_objects(URL, remote['checksum'], cache_dir)
+    with open(f"{cache_dir}/{remote['checksum']}.pkl", 'wb') as file:
+        file.write(b'garbage')
+
+    with pytest.warns(UserWarning, match='does not match its checksum'):
+        objects, checksum = load_model_objects(URL, remote['checksum'], cache_dir)
+    assert objects == {'model': 'model 1'} and checksum == remote['checksum']
+    assert remote['downloads'] == 2
+
+
+def test_unpinned_remote_copy_is_reused_within_max_age(remote, cache_dir, tmp_path):
+    first = load_model_objects(URL, None, cache_dir)[1]
+    # A new model published at the URL is not seen until the copy is too old
+    remote['path'] = tmp_path / 'remote2.pkl'
+    second_checksum = write_model(remote['path'], 2)
+    assert load_model_objects(URL, None, cache_dir, max_age_hours=1)[1] == first
+    assert remote['downloads'] == 1
+
+    objects, checksum = load_model_objects(URL, None, cache_dir, max_age_hours=0)
+    assert objects == {'model': 'model 2'} and checksum == second_checksum
+    entry = read_index(cache_dir)[URL]
+    assert entry['checksum'] == second_checksum and time.time() - entry['fetched'] < 60
+
+
+def test_failed_refresh_falls_back_to_the_previous_copy(remote, cache_dir):
+    first = load_model_objects(URL, None, cache_dir)[1]
+    fetched = read_index(cache_dir)[URL]['fetched']
+    remote['path'] = None
+
+    with pytest.warns(UserWarning, match='Could not refresh'):
+        objects, checksum = load_model_objects(URL, None, cache_dir, max_age_hours=0)
+    assert objects == {'model': 'model 1'} and checksum == first
+    assert read_index(cache_dir)[URL]['fetched'] == fetched
+
+
+def test_failed_fetch_without_a_previous_copy_raises(remote, cache_dir):
+    remote['path'] = None
+    with pytest.raises(ConnectionError):
+        load_model_objects(URL, None, cache_dir)
+
+
+def test_old_index_format_is_rewritten(remote, cache_dir):
+    load_model_objects(URL, None, cache_dir)
+    # Earlier versions stored the bare checksum; such an entry is refreshed
+    with open(f'{cache_dir}/index.json', 'w') as file:
+        json.dump({URL: remote['checksum']}, file)
+    load_model_objects(URL, None, cache_dir)
+    assert remote['downloads'] == 2
+    assert read_index(cache_dir)[URL]['checksum'] == remote['checksum']
@@ -0,0 +1,68 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_scoring import OUTPUT_COLUMNS, iter_chunks, score_file
+from features import INPUT_COLUMNS, FeatureEncoder
+from workload import random_frame
+
+
+@pytest.fixture(scope='module')
+def frame():
+    # Extra columns in the file are ignored
+    return random_frame(2_500, seed=3).assign(Accident_Index=np.arange(2_500))
+
+
+def write(frame, file_type):
+    buffer = io.BytesIO()
+    if file_type == 'csv':
+        buffer.write(frame.to_csv(index=False).encode())
+    else:
+        frame.to_parquet(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize('file_type', ['csv', 'parquet'])
+def test_iter_chunks_reads_every_row_with_increasing_progress(frame, file_type):
+    chunks = list(iter_chunks(write(frame, file_type), f'accidents.{file_type}', chunk_size=1_000))
+    assert [len(chunk) for chunk, _ in chunks] == [1_000, 1_000, 500]
+    fractions = [fraction for _, fraction in chunks]
+    assert fractions == sorted(fractions) and fractions[-1] == 1.0
+    read = pd.concat([chunk for chunk, _ in chunks], ignore_index=True)
+    assert list(read.columns) == INPUT_COLUMNS
+    pd.testing.assert_frame_equal(read, frame[INPUT_COLUMNS], check_dtype=False)
+
+
+@pytest.mark.parametrize('file_type', ['csv', 'parquet'])
+@pytest.mark.parametrize('threshold', [0.3, 0.55])
+def test_score_file_matches_predict_proba(standin_objects, frame, file_type, threshold):
+    model = standin_objects['model']
+    encoder = FeatureEncoder()
+    output = io.StringIO()
+    progress = []
+    rows_scored = score_file(model, encoder, write(frame, file_type), f'accidents.{file_type}', output,
+                             chunk_size=1_000, threshold=threshold,
+                             progress=lambda fraction, rows: progress.append(rows))
+    assert rows_scored == len(frame)
+    assert progress == [1_000, 2_000, 2_500]
+
+    output.seek(0)
+    results = pd.read_csv(output)
+    assert list(results.columns) == OUTPUT_COLUMNS
+    np.testing.assert_array_equal(results['row'], np.arange(len(frame)))
+    expected = model.predict_proba(encoder.encode_frame(frame))
+    np.testing.assert_allclose(results[['Probability_Slight', 'Probability_Serious']], expected, atol=1e-6)
+    # Labels come from the unrounded probabilities
+    labels = np.where(expected[:, 1] >= threshold, 'Serious', 'Slight')
+    np.testing.assert_array_equal(results['Predicted_Severity'], labels)
+
+
+def test_score_file_reports_bad_rows(standin_objects, frame):
+    bad = frame.copy()
+    bad.loc[1_500, 'Road_Type'] = 'Motorway'
+    with pytest.raises(ValueError, match="column 'Road_Type'"):
+        score_file(standin_objects['model'], FeatureEncoder(), write(bad, 'csv'), 'accidents.csv', io.StringIO(),
+                   chunk_size=1_000)
@@ -0,0 +1,85 @@
+import io
+
+import numpy as np
+import pytest
+from sklearn.metrics import confusion_matrix, f1_score, precision_score, recall_score
+
+from evaluation import LABEL_COLUMN, ThresholdSweep, encode_labels, evaluate_file
+from features import FeatureEncoder
+from workload import random_frame
+
+
+def probabilities_with_ties(rows=120_000, seed=0):
+    rng = np.random.default_rng(seed)
+    thresholds = np.arange(1_001) / 1_000
+    # Uniform values, values exactly on, one ulp below and one ulp above every
+    # threshold, and forest-style multiples of 1/n_trees
+    return np.concatenate([
+        rng.random(rows),
+        thresholds,
+        np.nextafter(thresholds, 0),
+        np.nextafter(thresholds, 1),
+        np.arange(101) / 100,
+        np.arange(8) / 7,
+        [0.0, 1.0],
+    ]).clip(0, 1)
+
+
+@pytest.fixture(scope='module')
+def data():
+    probability_serious = probabilities_with_ties()
+    rng = np.random.default_rng(1)
+    labels = (rng.random(len(probability_serious)) < probability_serious).astype(int)
+    return labels, probability_serious
+
+
+@pytest.fixture(scope='module')
+def results(data):
+    labels, probability_serious = data
+    sweep = ThresholdSweep()
+    # In chunks, as evaluate_file feeds it
+    for start in range(0, len(labels), 25_000):
+        sweep.update(labels[start:start + 25_000], probability_serious[start:start + 25_000])
+    assert sweep.rows == len(labels)
+    return sweep.results()
+
+
+def test_confusion_matrices_match_sklearn_at_every_threshold(data, results):
+    labels, probability_serious = data
+    for row in results.itertuples():
+        predicted = (probability_serious >= row.threshold).astype(int)
+        tn, fp, fn, tp = confusion_matrix(labels, predicted, labels=[0, 1]).ravel()
+        assert (row.tp, row.fp, row.fn, row.tn) == (tp, fp, fn, tn), row.threshold
+
+
+@pytest.mark.parametrize('threshold', [0.0, 0.117, 0.25, 0.55, 0.561, 0.999, 1.0])
+def test_scores_match_sklearn(data, results, threshold):
+    labels, probability_serious = data
+    predicted = (probability_serious >= threshold).astype(int)
+    row = results.iloc[int(round(threshold * 1_000))]
+    assert row.threshold == threshold
+    assert row.precision == pytest.approx(precision_score(labels, predicted, zero_division=0))
+    assert row.recall == pytest.approx(recall_score(labels, predicted, zero_division=0))
+    assert row.f1 == pytest.approx(f1_score(labels, predicted, zero_division=0))
+    assert row.accuracy == pytest.approx((labels == predicted).mean())
+
+
+def test_labels_are_encoded_from_names_and_codes():
+    np.testing.assert_array_equal(encode_labels(['Fatal', 'serious', ' Slight ', 1, 2, 3, '3.0']), [1, 1, 0, 1, 1, 0, 0])
+    with pytest.raises(ValueError, match=LABEL_COLUMN):
+        encode_labels(['Serious', 'Unknown'])
+
+
+def test_evaluate_file_matches_sklearn(standin_objects):
+    model = standin_objects['model']
+    encoder = FeatureEncoder()
+    frame = random_frame(3_000, seed=2)
+    labels = np.random.default_rng(2).integers(0, 2, len(frame))
+    frame[LABEL_COLUMN] = np.where(labels == 1, 'Serious', 'Slight')
+    file = io.BytesIO(frame.to_csv(index=False).encode())
+
+    sweep = evaluate_file(model, encoder, file, 'labelled.csv', chunk_size=1_000)
+    row = sweep.results().iloc[550]
+    predicted = (model.predict_proba(encoder.encode_frame(frame))[:, 1] >= 0.55).astype(int)
+    tn, fp, fn, tp = confusion_matrix(labels, predicted, labels=[0, 1]).ravel()
+    assert (row.tp, row.fp, row.fn, row.tn) == (tp, fp, fn, tn)
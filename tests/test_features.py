@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import FunctionTransformer, LabelEncoder
+
+from features import INPUT_COLUMNS, FeatureEncoder
+from workload import random_frame
+
+
+@pytest.fixture(scope='module')
+def encoder():
+    return FeatureEncoder()
+
+
+@pytest.fixture
+def record():
+    return random_frame(1).iloc[0].to_dict()
+
+
+def test_record_and_frame_encodings_agree(encoder):
+    frame = random_frame(200)
+    records = np.vstack([encoder.encode_record(row) for row in frame.to_dict('records')])
+    np.testing.assert_array_equal(encoder.encode_frame(frame), records)
+
+
+@pytest.mark.parametrize('column', ['Latitude', 'Longitude', 'Number_of_Vehicles', 'Number_of_Casualties'])
+@pytest.mark.parametrize('value', [None, float('nan'), float('inf'), 'north', [55.0], True])
+def test_record_rejects_missing_or_non_numeric_values(encoder, record, column, value):
+    record[column] = value
+    with pytest.raises(ValueError, match=f"column '{column}'"):
+        encoder.encode_record(record)
+
+
+@pytest.mark.parametrize('value', ['Motorway', None, ['Car'], {'Car': 1}])
+def test_record_rejects_unknown_or_unhashable_categories(encoder, record, value):
+    record['Road_Type'] = value
+    with pytest.raises(ValueError, match="column 'Road_Type'"):
+        encoder.encode_record(record)
+
+
+def test_record_rejects_missing_columns(encoder, record):
+    del record['Latitude']
+    with pytest.raises(ValueError, match='Latitude'):
+        encoder.encode_record(record)
+
+
+@pytest.mark.parametrize('column', ['Latitude', 'Number_of_Casualties'])
+@pytest.mark.parametrize('value', [np.nan, np.inf, 'north'])
+def test_frame_rejects_missing_or_non_numeric_values(encoder, column, value):
+    frame = random_frame(10).astype({column: object})
+    frame.loc[3, column] = value
+    with pytest.raises(ValueError, match=f"1 missing or non-numeric value\\(s\\) in column '{column}'"):
+        encoder.encode_frame(frame)
+
+
+def test_frame_rejects_blank_csv_cells(encoder, tmp_path):
+    path = tmp_path / 'accidents.csv'
+    frame = random_frame(5)
+    frame.loc[2, 'Longitude'] = None
+    frame.to_csv(path, index=False)
+    with pytest.raises(ValueError, match="column 'Longitude'"):
+        encoder.encode_frame(pd.read_csv(path, usecols=INPUT_COLUMNS))
+
+
+def _objects(**overrides):
+    objects = {'label_encoder': None, 'customer_category_mapping': None,
+               'day_sin_transformer': None, 'day_cos_transformer': None}
+    return {**objects, **overrides}
+
+
+def test_pickled_mapping_that_disagrees_is_not_used(record):
+    # Alphabetical classes would code Rural as 0 and Urban as 1, the reverse of the app
+    label_encoder = LabelEncoder().fit(['Urban', 'Rural'])
+    with pytest.warns(UserWarning, match="'Urban_or_Rural_Area'"):
+        encoder = FeatureEncoder.from_objects(_objects(label_encoder=label_encoder))
+    record['Urban_or_Rural_Area'] = 'Urban'
+    np.testing.assert_array_equal(encoder.encode_record(record), FeatureEncoder().encode_record(record))
+
+
+def test_pickled_encoding_that_agrees_is_silent(recwarn):
+    objects = _objects(
+        label_encoder=LabelEncoder().fit(['Darkness', 'Daylight']),
+        customer_category_mapping={'Road_Type': {'Dual carriageway': 0, 'One way street': 1, 'Roundabout': 2,
+                                                 'Single carriageway': 3, 'Slip road': 4}},
+        day_sin_transformer=FunctionTransformer(lambda x: np.sin(2 * np.pi * x / 7)),
+        day_cos_transformer=FunctionTransformer(lambda x: np.cos(2 * np.pi * x / 7)),
+    )
+    FeatureEncoder.from_objects(objects)
+    assert not [warning for warning in recwarn if issubclass(warning.category, UserWarning)]
+
+
+def test_pickled_day_transformer_on_another_indexing_is_not_used(record):
+    # Fitted with Sunday = 0, so Monday = 0 from the app would be shifted by a day
+    shifted = FunctionTransformer(lambda x: np.sin(2 * np.pi * (x + 1) / 7))
+    with pytest.warns(UserWarning, match='day_sin_transformer'):
+        encoder = FeatureEncoder.from_objects(_objects(day_sin_transformer=shifted))
+    np.testing.assert_array_equal(encoder.encode_record(record), FeatureEncoder().encode_record(record))
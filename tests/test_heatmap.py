@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from features import LATITUDE_RANGE, LONGITUDE_RANGE, FeatureEncoder
+from heatmap import HeatmapCache, to_image_url
+from workload import random_frame
+
+
+@pytest.fixture
+def features():
+    return FeatureEncoder().encode_record(random_frame(1).iloc[0].to_dict())
+
+
+def single_cell(model, features, step, latitude_bounds, longitude_bounds):
+    latitudes, longitudes, probabilities = HeatmapCache().probabilities(
+        model, features, 'checksum', step, latitude_bounds, longitude_bounds)
+    assert probabilities.shape == (1, 1)
+    assert not np.isnan(probabilities).any()
+    assert to_image_url(probabilities).startswith('data:image/png;base64,')
+    return latitudes[0], longitudes[0]
+
+
+@pytest.mark.parametrize('step', [0.01, 0.04, 0.16])
+@pytest.mark.parametrize('latitude, longitude', [
+    (55.0, -2.0),
+    (55.0049, -2.0049),
+    # Edges of the lattice, which coarse spacings do not reach exactly
+    (LATITUDE_RANGE[0], LONGITUDE_RANGE[0]),
+    (LATITUDE_RANGE[1], LONGITUDE_RANGE[1]),
+])
+def test_zero_width_range_returns_the_nearest_cell(standin_objects, features, step, latitude, longitude):
+    cell_latitude, cell_longitude = single_cell(
+        standin_objects['model'], features, step, (latitude, latitude), (longitude, longitude))
+    assert abs(cell_latitude - latitude) <= step + 1e-9
+    assert abs(cell_longitude - longitude) <= step + 1e-9
+
+
+def test_range_narrower_than_the_spacing_returns_the_nearest_cell(standin_objects, features):
+    # Lattice points at 0.16 spacing fall at 55.0345 and 55.1945 (latitude)
+    # and -2.0762 and -1.9162 (longitude), none of them inside these ranges
+    cell_latitude, cell_longitude = single_cell(
+        standin_objects['model'], features, 0.16, (55.04, 55.10), (-2.05, -1.95))
+    assert cell_latitude == pytest.approx(55.034488)
+    assert cell_longitude == pytest.approx(-2.076225)
+
+
+def test_cells_match_direct_predictions(standin_objects, features):
+    model = standin_objects['model']
+    latitudes, longitudes, probabilities = HeatmapCache().probabilities(
+        model, features, 'checksum', 0.16, (54.0, 55.0), (-3.0, -2.0))
+    assert probabilities.shape == (len(latitudes), len(longitudes)) == (6, 6)
+    rows = np.repeat(features, probabilities.size, axis=0)
+    rows[:, 2] = np.repeat(latitudes, len(longitudes))
+    rows[:, 3] = np.tile(longitudes, len(latitudes))
+    np.testing.assert_allclose(probabilities.ravel(), model.predict_proba(rows)[:, 1], rtol=1e-6)
+
+
+def test_stats_count_grids_and_reused_cells(standin_objects, features):
+    cache = HeatmapCache(max_grids=2)
+    model = standin_objects['model']
+    cache.probabilities(model, features, 'checksum', 0.16, (54.0, 55.0), (-3.0, -2.0))
+    # The same view at the same inputs scores nothing new
+    cache.probabilities(model, features, 'checksum', 0.16, (54.0, 55.0), (-3.0, -2.0))
+    assert cache.stats() == {'grids': 1, 'max_grids': 2, 'cells_scored': 36}
+    for vehicles in (2, 3):
+        other = features.copy()
+        other[0, 4] = vehicles
+        cache.probabilities(model, other, 'checksum', 0.16, (54.0, 55.0), (-3.0, -2.0))
+    assert cache.stats() == {'grids': 2, 'max_grids': 2, 'cells_scored': 72}
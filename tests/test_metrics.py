@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from metrics import LATENCY_BUCKETS, ROLLING_WINDOW, Metrics, resident_memory_bytes
+
+PREFIX = 'accident_severity_'
+
+
+def prometheus_lines(metrics):
+    return metrics.to_prometheus().splitlines()
+
+
+def test_counters_and_gauges():
+    metrics = Metrics(enabled=True)
+    metrics.increment('rows_total')
+    metrics.increment('rows_total', 4)
+    metrics.set_gauge('memory_bytes', 10)
+    metrics.set_gauge('memory_bytes', 12)
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'rows_total': 5}
+    assert snapshot['gauges'] == {'memory_bytes': 12}
+
+    lines = prometheus_lines(metrics)
+    assert f'# TYPE {PREFIX}rows_total counter' in lines
+    assert f'{PREFIX}rows_total 5' in lines
+    assert f'# TYPE {PREFIX}memory_bytes gauge' in lines
+    assert f'{PREFIX}memory_bytes 12' in lines
+
+
+def test_prometheus_histogram_buckets_are_cumulative():
+    metrics = Metrics(enabled=True)
+    values = [0.0001, 0.0005, 0.003, 0.003, 0.2, 45.0]
+    for value in values:
+        metrics.observe('step_seconds', value)
+
+    lines = prometheus_lines(metrics)
+    assert f'# TYPE {PREFIX}step_seconds histogram' in lines
+    buckets = {}
+    for line in lines:
+        if line.startswith(f'{PREFIX}step_seconds_bucket'):
+            bound, count = line.split('{le="')[1].split('"} ')
+            buckets[bound] = int(count)
+
+    assert list(buckets) == [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+    # A bucket counts every observation at or below its bound
+    for bound in LATENCY_BUCKETS:
+        assert buckets[str(bound)] == sum(value <= bound for value in values)
+    assert buckets['0.0005'] == 2
+    assert buckets['+Inf'] == len(values)
+    assert f'{PREFIX}step_seconds_count {len(values)}' in lines
+    total = float(next(line for line in lines if line.startswith(f'{PREFIX}step_seconds_sum')).split()[1])
+    assert total == pytest.approx(sum(values))
+
+
+def test_timer_records_into_the_snapshot():
+    metrics = Metrics(enabled=True)
+    for _ in range(3):
+        with metrics.timer('block_seconds'):
+            pass
+    with pytest.raises(RuntimeError):
+        with metrics.timer('block_seconds'):
+            raise RuntimeError
+    summary = metrics.snapshot()['latencies']['block_seconds']
+    assert summary['count'] == 4
+    assert 0 <= summary['p50'] <= summary['p95'] <= summary['p99']
+    assert json.loads(metrics.to_json())['latencies']['block_seconds']['count'] == 4
+
+
+def test_percentiles_use_the_rolling_window():
+    metrics = Metrics(enabled=True)
+    for _ in range(ROLLING_WINDOW):
+        metrics.observe('step_seconds', 10.0)
+    for _ in range(ROLLING_WINDOW):
+        metrics.observe('step_seconds', 0.001)
+    summary = metrics.snapshot()['latencies']['step_seconds']
+    assert summary['count'] == 2 * ROLLING_WINDOW
+    assert summary['p99'] == pytest.approx(0.001)
+    assert summary['mean'] == pytest.approx((10.0 + 0.001) / 2)
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.increment('rows_total')
+    metrics.set_gauge('memory_bytes', 1)
+    metrics.observe('step_seconds', 1.0)
+    with metrics.timer('block_seconds'):
+        pass
+    assert metrics.snapshot() == {'enabled': False, 'counters': {}, 'gauges': {}, 'latencies': {}}
+    assert metrics.to_prometheus() == '\n'
+
+
+def test_metrics_can_be_disabled_from_the_environment():
+    # In a fresh process, since the setting is read at import
+    code = 'import metrics; print(metrics.metrics.enabled)'
+    env = dict(os.environ, METRICS_ENABLED='0')
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == 'False'
+
+
+def test_resident_memory_is_reported():
+    assert resident_memory_bytes() > 1_000_000
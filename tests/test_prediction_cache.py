@@ -0,0 +1,117 @@
+import threading
+
+import numpy as np
+import pytest
+
+from metrics import metrics
+from prediction_cache import PredictionCache
+
+
+class CountingModel:
+    """Returns P(Serious) = latitude / 100 and records every batch it is asked for."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict_proba(self, features):
+        self.batches.append(np.array(features))
+        serious = features[:, 2] / 100
+        return np.column_stack([1 - serious, serious])
+
+
+def row(latitude, longitude=-2.0, vehicles=1):
+    return np.array([[0.0, 1.0, latitude, longitude, vehicles, 1, 0, 0, 0, 0, 0, 0, 0]])
+
+
+@pytest.fixture
+def model():
+    return CountingModel()
+
+
+def test_repeated_rows_are_served_from_the_cache(model):
+    cache = PredictionCache(maxsize=10)
+    first = cache.predict_proba(model, row(55.0), 'a')
+    second = cache.predict_proba(model, row(55.0), 'a')
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_allclose(first, [[0.45, 0.55]])
+    assert len(model.batches) == 1
+    assert cache.stats() == {'size': 1, 'maxsize': 10, 'hits': 1, 'misses': 1, 'evictions': 0, 'hit_rate': 0.5}
+
+
+def test_coordinates_are_rounded_before_lookup_and_prediction(model):
+    cache = PredictionCache(precision=3)
+    cache.predict_proba(model, row(55.00049, -2.00049), 'a')
+    cache.predict_proba(model, row(54.99951, -1.99951), 'a')
+    assert len(model.batches) == 1
+    np.testing.assert_array_equal(model.batches[0][0, 2:4], [55.0, -2.0])
+
+
+def test_least_recently_used_row_is_evicted(model):
+    cache = PredictionCache(maxsize=2)
+    cache.predict_proba(model, row(50.0), 'a')
+    cache.predict_proba(model, row(51.0), 'a')
+    # Touch 50 so 51 becomes the least recently used
+    cache.predict_proba(model, row(50.0), 'a')
+    cache.predict_proba(model, row(52.0), 'a')
+    assert cache.stats()['evictions'] == 1
+
+    calls = len(model.batches)
+    cache.predict_proba(model, row(50.0), 'a')
+    assert len(model.batches) == calls
+    cache.predict_proba(model, row(51.0), 'a')
+    assert len(model.batches) == calls + 1
+    assert len(cache) == 2
+
+
+def test_only_missing_rows_are_predicted_in_one_batch(model):
+    cache = PredictionCache()
+    cache.predict_proba(model, row(50.0), 'a')
+    features = np.vstack([row(50.0), row(51.0), row(52.0), row(51.0)])
+    probabilities = cache.predict_proba(model, features, 'a')
+    np.testing.assert_allclose(probabilities[:, 1], [0.50, 0.51, 0.52, 0.51])
+    # Duplicates within one call are predicted with the other misses and stored once
+    assert len(model.batches) == 2 and len(model.batches[1]) == 3
+    assert len(cache) == 3
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 4
+
+
+def test_new_model_checksum_empties_the_cache(model):
+    cache = PredictionCache()
+    cache.predict_proba(model, row(50.0), 'a')
+    cache.predict_proba(model, row(50.0), 'b')
+    assert len(model.batches) == 2
+    assert len(cache) == 1 and cache.model_checksum == 'b'
+
+
+def test_results_of_an_old_model_are_not_stored():
+    cache = PredictionCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowModel(CountingModel):
+        def predict_proba(self, features):
+            started.set()
+            release.wait(5)
+            return super().predict_proba(features)
+
+    # The old model's prediction finishes after a new model has been used
+    old = threading.Thread(target=cache.predict_proba, args=(SlowModel(), row(50.0), 'old'))
+    old.start()
+    started.wait(5)
+    cache.predict_proba(CountingModel(), row(51.0), 'new')
+    release.set()
+    old.join(5)
+
+    new_model = CountingModel()
+    cache.predict_proba(new_model, row(50.0), 'new')
+    assert len(new_model.batches) == 1
+    assert cache.model_checksum == 'new' and len(cache) == 2
+
+
+def test_only_model_calls_are_timed_as_model_latency(model):
+    cache = PredictionCache()
+    before = metrics.snapshot()['latencies'].get('predict_model_seconds', {}).get('count', 0)
+    for _ in range(3):
+        cache.predict_proba(model, row(50.0), 'a')
+    after = metrics.snapshot()['latencies'].get('predict_model_seconds', {}).get('count', 0)
+    assert after - before == (1 if metrics.enabled else 0)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from features import FeatureEncoder
+from serve import MicroBatcher, make_app
+from workload import random_frame
+
+
+def post_all(app, bodies):
+    """POST each body to /predict concurrently and return the responses."""
+    async def run():
+        sock, port = bind_unused_port()
+        server = HTTPServer(app)
+        server.add_sockets([sock])
+        client = AsyncHTTPClient()
+        try:
+            return await asyncio.gather(*(
+                client.fetch(f'http://127.0.0.1:{port}/predict', method='POST', body=body, raise_error=False)
+                for body in bodies))
+        finally:
+            server.stop()
+    return asyncio.run(run())
+
+
+@pytest.fixture(scope='module')
+def app(standin_objects):
+    return make_app(standin_objects, 'checksum', window=0.002)
+
+
+def test_predict_scores_a_record(app, standin_objects):
+    record = random_frame(1).iloc[0].to_dict()
+    response, = post_all(app, [json.dumps(record, default=float)])
+    assert response.code == 200
+    expected = standin_objects['model'].predict_proba(FeatureEncoder().encode_record(record))[0]
+    assert json.loads(response.body)['probability_serious'] == pytest.approx(expected[1])
+
+
+@pytest.mark.parametrize('change', [
+    {'Latitude': None},
+    {'Latitude': float('nan')},
+    {'Number_of_Vehicles': 'two'},
+    {'Road_Type': ['x']},
+    {'Road_Type': {'x': 1}},
+    {'Day_of_Week': 'Someday'},
+])
+def test_malformed_records_are_rejected(app, change):
+    record = {**random_frame(1).iloc[0].to_dict(), **change}
+    response, = post_all(app, [json.dumps(record, default=float)])
+    assert response.code == 400
+    assert json.loads(response.body)['error']
+
+
+@pytest.mark.parametrize('body', ['not json', '[1, 2]', '{}'])
+def test_malformed_bodies_are_rejected(app, body):
+    response, = post_all(app, [body])
+    assert response.code == 400
+
+
+def test_batcher_scores_concurrent_rows_and_releases_batches(standin_objects):
+    model = standin_objects['model']
+    batcher = MicroBatcher(model, window=0.002, max_batch_size=16)
+    features = FeatureEncoder().encode_frame(random_frame(40))
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict_proba(row[None]) for row in features))
+
+    probabilities = np.vstack(asyncio.run(run()))
+    np.testing.assert_allclose(probabilities, model.predict_proba(features))
+    assert not batcher._tasks
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from tree_engine import CompiledForest, _sample_inputs, compile_model, max_difference
+
+
+def training_data(rows=2_000, features=6, missing=False, seed=0):
+    rng = np.random.default_rng(seed)
+    # Few distinct values per feature, so many inputs fall exactly on a threshold
+    X = rng.integers(0, 8, (rows, features)).astype(np.float64)
+    X[:, 0] = rng.normal(size=rows)
+    y = (X[:, 0] + X[:, 1] / 4 + rng.normal(size=rows) > 1).astype(int)
+    if missing:
+        X[rng.random(X.shape) < 0.1] = np.nan
+    return X, y
+
+
+def inputs(model, engine, rows=1_000, seed=1):
+    # Values on, just below and just above every threshold, and missing cells
+    rng = np.random.default_rng(seed)
+    X = np.zeros((rows, model.n_features_in_))
+    split = np.isfinite(engine.threshold)
+    for feature in range(model.n_features_in_):
+        thresholds = engine.threshold[split & (engine.feature == feature)]
+        if len(thresholds):
+            X[:, feature] = rng.choice(thresholds, rows) + rng.choice([-1e-6, 0, 1e-6], rows)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return X
+
+
+@pytest.mark.parametrize('model', [
+    RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0),
+    RandomForestClassifier(n_estimators=20, random_state=0),
+    DecisionTreeClassifier(random_state=0),
+])
+@pytest.mark.parametrize('missing_in_training', [False, True])
+def test_traverse_matches_sklearn_with_missing_values(model, missing_in_training):
+    model.fit(*training_data(missing=missing_in_training))
+    engine = CompiledForest(model)
+    X = inputs(model, engine)
+    assert np.isnan(X).any(axis=1).mean() > 0.3
+    np.testing.assert_array_equal(engine.traverse(X), model.predict_proba(X))
+
+
+def test_traverse_matches_sklearn_on_thresholds_for_extra_trees():
+    # Extra trees reject NaN, so only complete rows are compared
+    model = ExtraTreesClassifier(n_estimators=20, random_state=0).fit(*training_data())
+    engine = CompiledForest(model)
+    X = np.nan_to_num(inputs(model, engine))
+    np.testing.assert_array_equal(engine.traverse(X), model.predict_proba(X))
+
+
+def test_predict_proba_leaves_missing_values_to_sklearn():
+    model = ExtraTreesClassifier(n_estimators=5, random_state=0).fit(*training_data())
+    engine = compile_model(model)
+    assert isinstance(engine, CompiledForest)
+    X = inputs(model, engine, rows=10)
+    X[0, 0] = np.nan
+    with pytest.raises(ValueError, match='NaN'):
+        engine.predict_proba(X)
+
+
+def test_compile_model_self_check_covers_missing_values():
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(*training_data(missing=True))
+    engine = CompiledForest(model)
+    samples = _sample_inputs(engine)
+    assert max_difference(model, engine, samples) == 0
+    # An engine sending missing values the wrong way must fail the check
+    engine.missing_left = ~engine.missing_left
+    assert max_difference(model, engine, samples) > 0
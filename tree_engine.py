@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier, ExtraTreeClassifier
+
+# Set COMPILED_INFERENCE=0 to always predict with sklearn
+COMPILED_INFERENCE = os.environ.get('COMPILED_INFERENCE', '1') != '0'
+
+# Batches larger than this go to sklearn's own predict_proba. Level-by-level
+# traversal in NumPy removes sklearn's fixed per-call overhead, which dominates
+# small batches, but sklearn's compiled loop is faster once batches get large.
+COMPILED_INFERENCE_MAX_ROWS = int(os.environ.get('COMPILED_INFERENCE_MAX_ROWS', 1_000))
+
+# Upper bound on rows x trees traversed at once. Small blocks keep the
+# per-level temporaries in cache, and memory bounded for any batch size
+_MAX_BLOCK_CELLS = 262_144
+
+_SUPPORTED_MODELS = (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier, ExtraTreeClassifier)
+
+
+class CompiledForest:
+    """Tree ensemble flattened into contiguous NumPy node arrays.
+
+    All trees are stored back to back: ``feature``, ``threshold``, ``left``,
+    ``right`` and ``missing_left`` per node and ``value`` holding the class
+    probabilities of each leaf. Leaves point to themselves, so a batch is
+    evaluated by moving every (row, tree) pair one level down ``max_depth`` times.
+
+    ``predict_proba`` traverses batches of up to ``max_rows`` rows without
+    missing values and hands any other batch to the original model, so NaN is
+    handled (or rejected) exactly as sklearn does; ``traverse`` always uses the
+    arrays and sends NaN down the side sklearn's ``missing_go_to_left`` records.
+    """
+
+    def __init__(self, model, max_rows=COMPILED_INFERENCE_MAX_ROWS):
+        self.model = model
+        self.max_rows = max_rows
+        estimators = model.estimators_ if hasattr(model, 'estimators_') else [model]
+        trees = [estimator.tree_ for estimator in estimators]
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError('Only single-output trees can be compiled')
+
+        self.classes_ = model.classes_
+        self.n_features_in_ = model.n_features_in_
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self.roots = offsets[:-1].astype(np.intp)
+        self.feature = np.concatenate([tree.feature for tree in trees]).astype(np.intp)
+        self.threshold = np.concatenate([tree.threshold for tree in trees])
+        self.left = np.concatenate([tree.children_left + offset for tree, offset in zip(trees, offsets)]).astype(np.intp)
+        self.right = np.concatenate([tree.children_right + offset for tree, offset in zip(trees, offsets)]).astype(np.intp)
+        # sklearn < 1.3 has no missing value support, where NaN <= threshold sends rows right
+        self.missing_left = np.concatenate([
+            getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8)) for tree in trees
+        ]).astype(bool)
+
+        leaves = np.concatenate([tree.children_left == -1 for tree in trees])
+        node_ids = np.arange(len(leaves), dtype=np.intp)
+        self.left[leaves] = node_ids[leaves]
+        self.right[leaves] = node_ids[leaves]
+        self.feature[leaves] = 0
+        self.threshold[leaves] = np.inf
+
+        # children[2 * node + go_left] is the next node, so each level needs
+        # a single gather instead of gathering both children and selecting
+        self.children = np.empty(2 * len(leaves), dtype=np.intp)
+        self.children[0::2] = self.right
+        self.children[1::2] = self.left
+
+        # Normalise leaf values to probabilities, as DecisionTreeClassifier.predict_proba does
+        value = np.concatenate([tree.value[:, 0, :] for tree in trees]).astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1
+        self.value = value / totals
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict_proba(self, X):
+        if len(X) > self.max_rows or np.isnan(X).any():
+            return self.model.predict_proba(X)
+        return self.traverse(X)
+
+    def traverse(self, X):
+        # sklearn compares float32 inputs with float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'Expected an array of shape (n, {self.n_features_in_}), got {X.shape}')
+
+        probabilities = np.empty((len(X), len(self.classes_)))
+        has_missing = np.isnan(X).any()
+        block_rows = max(1, _MAX_BLOCK_CELLS // self.n_trees)
+        for start in range(0, len(X), block_rows):
+            block = X[start:start + block_rows]
+            # Offset of each row in the flattened block, to gather X[row, feature] in one take
+            row_offsets = (np.arange(len(block), dtype=np.intp) * block.shape[1])[:, None]
+            flat = block.ravel()
+            node = np.broadcast_to(self.roots, (len(block), self.n_trees)).copy()
+            for _ in range(self.max_depth):
+                values = flat[row_offsets + self.feature[node]]
+                go_left = values <= self.threshold[node]
+                if has_missing:
+                    missing = np.isnan(values)
+                    go_left[missing] = self.missing_left[node[missing]]
+                node = self.children[2 * node + go_left]
+            probabilities[start:start + len(block)] = self.value[node].mean(axis=1)
+        return probabilities
+
+
+def max_difference(model, engine, X):
+    """Largest absolute difference between sklearn and the compiled traversal on X."""
+    return float(np.abs(model.predict_proba(X) - engine.traverse(X)).max())
+
+
+def _sample_inputs(engine, rows=512, missing_fraction=0.02, seed=0):
+    # Random rows spanning the thresholds of every feature, so the check
+    # exercises both sides of most splits, with some cells exactly on a
+    # threshold and some missing
+    rng = np.random.default_rng(seed)
+    split = np.isfinite(engine.threshold)
+    X = np.zeros((rows, engine.n_features_in_))
+    for feature in range(engine.n_features_in_):
+        thresholds = engine.threshold[split & (engine.feature == feature)]
+        if len(thresholds):
+            X[:, feature] = rng.uniform(thresholds.min() - 1, thresholds.max() + 1, rows)
+            on_threshold = rng.random(rows) < 0.1
+            X[on_threshold, feature] = rng.choice(thresholds, on_threshold.sum())
+    X[rng.random(X.shape) < missing_fraction] = np.nan
+    return X
+
+
+def compile_model(model, atol=1e-9):
+    """Return a CompiledForest for a supported tree model, or the model itself.
+
+    The compiled engine is checked against model.predict_proba on sample
+    inputs, including missing values where the model accepts them, and is
+    only returned when they agree within ``atol``.
+    """
+    if not COMPILED_INFERENCE or not isinstance(model, _SUPPORTED_MODELS):
+        return model
+    try:
+        engine = CompiledForest(model)
+    except (AttributeError, ValueError):
+        return model
+    samples = _sample_inputs(engine)
+    try:
+        difference = max_difference(model, engine, samples)
+    except ValueError:
+        # The model rejects NaN (e.g. extra trees); predict_proba hands such
+        # batches back to it, so only complete rows need to agree
+        difference = max_difference(model, engine, samples[~np.isnan(samples).any(axis=1)])
+    if difference > atol:
+        return model
+    return engine